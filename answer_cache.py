@@ -0,0 +1,137 @@
+"""
+Caché de respuestas del chatbot.
+
+Las preguntas frecuentes (botones de la interfaz, plazos de matrícula, fechas
+de la PAU) llegan una y otra vez con pequeñas variaciones. Antes de buscar y
+redactar la respuesta se consulta:
+
+1. la pregunta normalizada (sin acentos, mayúsculas ni signos), y si no está
+2. el vecino más cercano por embedding de la pregunta, si su similitud coseno
+   supera similarity_threshold y es del mismo tipo de pregunta.
+
+Las entradas caducan por antigüedad (ttl) y se expulsan por LRU al superar
+max_entries; todas se descartan cuando cambia la versión del índice.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+from keyword_matcher import fold
+
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_question(question: str) -> str:
+    """Sin acentos, mayúsculas ni signos: '¿Cuándo es la PAU?' -> 'cuando es la pau'"""
+    return ' '.join(PUNCTUATION.sub(' ', fold(question)).split())
+
+
+class AnswerCache:
+    """Respuestas recientes indexadas por pregunta normalizada y por embedding"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.lock = threading.Lock()
+        # pregunta normalizada -> entrada (el orden es el de uso, para el LRU)
+        self.entries: OrderedDict = OrderedDict()
+        self.index_version: Optional[str] = None
+        # Matriz de embeddings de las entradas (se reconstruye tras cambios)
+        self.matrix: Optional[np.ndarray] = None
+        self.matrix_keys = []
+        self.matrix_types: Optional[np.ndarray] = None
+
+        self.counters = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0,
+                         'evictions': 0, 'expired': 0, 'invalidations': 0}
+        self.saved_seconds = 0.0
+
+    def check_version(self, index_version: str):
+        """Vacía la caché si el índice ha cambiado desde que se llenó"""
+        if index_version != self.index_version:
+            if self.entries:
+                self.counters['invalidations'] += 1
+            self.entries.clear()
+            self.matrix = None
+            self.index_version = index_version
+
+    def expire(self, now: float):
+        expired = [key for key, entry in self.entries.items() if now - entry['created'] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self.counters['expired'] += len(expired)
+            self.matrix = None
+
+    def hit(self, key: str, kind: str, lookup_seconds: float) -> str:
+        entry = self.entries[key]
+        self.entries.move_to_end(key)
+        self.counters[kind] += 1
+        self.saved_seconds += max(entry['seconds'] - lookup_seconds, 0.0)
+        return entry['answer']
+
+    def get(self, question: str, index_version: str) -> Optional[str]:
+        """Búsqueda exacta por la pregunta normalizada"""
+        start = time.perf_counter()
+        key = normalize_question(question)
+        with self.lock:
+            self.check_version(index_version)
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry['created'] > self.ttl:
+                return None
+            return self.hit(key, 'exact_hits', time.perf_counter() - start)
+
+    def get_similar(self, embedding: np.ndarray, question_type: str, index_version: str) -> Optional[str]:
+        """Vecino más cercano por similitud coseno (cuenta un fallo si no lo hay)"""
+        start = time.perf_counter()
+        with self.lock:
+            self.check_version(index_version)
+            self.expire(time.time())
+            if self.entries:
+                if self.matrix is None:
+                    self.matrix_keys = list(self.entries)
+                    self.matrix = np.stack([self.entries[key]['embedding'] for key in self.matrix_keys])
+                    self.matrix_types = np.array([self.entries[key]['question_type'] for key in self.matrix_keys])
+                # Solo compiten las entradas del mismo tipo de pregunta
+                similarities = np.where(self.matrix_types == question_type,
+                                        self.matrix @ self.unit(embedding), -np.inf)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    return self.hit(self.matrix_keys[best], 'semantic_hits', time.perf_counter() - start)
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, question: str, embedding: np.ndarray, question_type: str, answer: str,
+            seconds: float, index_version: str):
+        """Guarda una respuesta recién calculada y lo que costó obtenerla"""
+        key = normalize_question(question)
+        with self.lock:
+            self.check_version(index_version)
+            self.entries[key] = {'answer': answer, 'embedding': self.unit(embedding),
+                                 'question_type': question_type, 'created': time.time(), 'seconds': seconds}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+            self.matrix = None
+
+    @staticmethod
+    def unit(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(embedding))
+        return embedding / norm if norm > 0 else embedding
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.matrix = None
+
+    def stats(self) -> Dict:
+        with self.lock:
+            hits = self.counters['exact_hits'] + self.counters['semantic_hits']
+            lookups = hits + self.counters['misses']
+            return dict(self.counters, entries=len(self.entries),
+                        hit_rate=round(hits / lookups, 3) if lookups else 0.0,
+                        saved_seconds=round(self.saved_seconds, 3))
@@ -1,29 +1,38 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-from chatbot import create_chatbot
-from knowledge_base import KnowledgeBase
 import json
 import time
 
 # Cargar variables de entorno
 load_dotenv()
 
+@st.cache_resource(show_spinner=False)
+def load_chatbot(hf_token):
+    """Un único chatbot por proceso: las sesiones comparten el modelo y la caché de respuestas"""
+    # Import diferido: la página se pinta antes de cargar el modelo
+    from chatbot import create_chatbot
+    chatbot = create_chatbot(hf_token)
+    chatbot.warm_up()
+    return chatbot
+
 def initialize_chatbot():
     """Inicializa el chatbot con caché"""
     if 'chatbot' not in st.session_state:
         hf_token = os.getenv('HUGGINGFACE_TOKEN')
         with st.spinner('🤖 Inicializando chatbot...'):
-            st.session_state.chatbot = create_chatbot(hf_token)
+            st.session_state.chatbot = load_chatbot(hf_token)
     return st.session_state.chatbot
 
 def initialize_knowledge_base():
     """Inicializa la base de conocimiento"""
     if 'kb_loaded' not in st.session_state:
-        kb = KnowledgeBase()
+        # La del chatbot compartido: otra instancia dejaría su almacén y su BM25 desfasados
+        kb = initialize_chatbot().knowledge_base
         
         # Buscar archivos de datos disponibles
         files_to_try = [
+            "unex_content.jsonl",
             "unex_content_enhanced.json",
             "unex_content.json"
         ]
@@ -277,6 +286,13 @@ def main():
                 st.metric("Páginas", "102", "✅")
             with col2:
                 st.metric("Chunks", "1325", "✅")
+            
+            # Caché de respuestas (compartida entre sesiones)
+            if 'chatbot' in st.session_state:
+                cache_stats = st.session_state.chatbot.cache_stats()
+                if cache_stats:
+                    st.metric("Caché de respuestas", f"{cache_stats['hit_rate']:.0%}",
+                              f"{cache_stats['saved_seconds']:.1f}s ahorrados")
         
         st.markdown("---")
         
@@ -0,0 +1,303 @@
+"""
+Benchmark offline del crawler contra un sitio sintético "tipo unex.es" servido
+en local: miles de páginas con menú/pie repetidos, enlaces a PDFs, variantes
+duplicadas de URLs (barra final, ?utm_*, #fragmento), endpoints lentos y
+endpoints que fallan, robots.txt y sitemap.xml.
+
+Informa de páginas/s, pico de memoria (RSS) y corrección del corpus.
+
+Uso:
+    python benchmark_crawl.py --pages 2000 --mode both
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from corpus_store import iter_corpus
+from web_scraper import EnhancedWebScraper, canonicalize_url
+
+TOPICS = ['matrícula', 'grados', 'becas', 'PAU', 'biblioteca', 'investigación',
+          'másteres', 'doctorado', 'Erasmus', 'residencias', 'deportes', 'idiomas']
+CAMPUS = ['Badajoz', 'Cáceres', 'Mérida', 'Plasencia']
+
+
+class SiteSpec:
+    """Parámetros del sitio sintético"""
+
+    def __init__(self, pages: int, pdf_every: int, slow_every: int, fail_every: int,
+                 latency_ms: float, slow_ms: float):
+        self.pages = pages
+        self.pdf_every = pdf_every
+        self.slow_every = slow_every
+        self.fail_every = fail_every
+        self.latency = latency_ms / 1000
+        self.slow = slow_ms / 1000
+
+    def is_failing(self, page: int) -> bool:
+        return self.fail_every > 0 and page % self.fail_every == self.fail_every - 1
+
+    def is_slow(self, page: int) -> bool:
+        return self.slow_every > 0 and page % self.slow_every == self.slow_every // 2
+
+    def has_pdf(self, page: int) -> bool:
+        return self.pdf_every > 0 and page % self.pdf_every == 0
+
+    def expected_pages(self) -> set:
+        """Páginas con contenido que un crawl completo debería recoger"""
+        return {f"/page/{i}" for i in range(self.pages) if not self.is_failing(i)}
+
+    def expected_pdfs(self) -> set:
+        return {f"/docs/doc{i}.pdf" for i in range(self.pages) if self.has_pdf(i)}
+
+
+def render_page(spec: SiteSpec, page: int) -> bytes:
+    """HTML de una página con boilerplate, contenido propio y enlaces (algunos duplicados)"""
+    nav = ''.join(f'<li><a href="/page/{i}">Sección {i}</a></li>' for i in range(20))
+    topic = TOPICS[page % len(TOPICS)]
+    campus = CAMPUS[page % len(CAMPUS)]
+    paragraphs = ''.join(
+        f"<p>Información {page}.{k} sobre {topic} en el campus de {campus}: los estudiantes "
+        f"de la Universidad de Extremadura pueden consultar plazos, requisitos y "
+        f"procedimientos del curso {2020 + k % 5}/{2021 + k % 5} en la sede electrónica.</p>"
+        for k in range(8)
+    )
+
+    links = []
+    for step in (1, 7, 31, 97, 331):
+        target = (page * 13 + step) % spec.pages
+        links.append(f'<a href="/page/{target}">Página {target}</a>')
+    # Variantes de la misma URL que deben deduplicarse
+    links.append(f'<a href="/page/{(page + 1) % spec.pages}/">barra final</a>')
+    links.append(f'<a href="/page/{(page + 2) % spec.pages}?utm_source=boletin">seguimiento</a>')
+    links.append(f'<a href="/page/{(page + 3) % spec.pages}#detalle">fragmento</a>')
+    if spec.has_pdf(page):
+        links.append(f'<a href="/docs/doc{page}.pdf">Normativa {page} (PDF)</a>')
+
+    html = f"""<!DOCTYPE html><html><head><title>Página {page} - {topic}</title>
+<script>var analytics = {page};</script><style>body {{ font-family: sans-serif; }}</style></head>
+<body><header><nav><ul>{nav}</ul></nav></header>
+<div class="cookie-banner">Utilizamos cookies propias y de terceros para mejorar nuestros servicios.</div>
+<main class="main-content"><h1>{topic.title()} - {campus}</h1>{paragraphs}<div>{' '.join(links)}</div></main>
+<aside class="sidebar"><a href="/page/0">Inicio</a></aside>
+<footer>Universidad de Extremadura · Avda. de Elvas s/n · 06006 Badajoz · Tel. 924 28 93 00</footer>
+</body></html>"""
+    return html.encode('utf-8')
+
+
+def render_pdf(page: int) -> bytes:
+    """PDF pequeño y válido generado con PyMuPDF"""
+    import fitz
+    doc = fitz.open()
+    for number in range(3):
+        pdf_page = doc.new_page()
+        pdf_page.insert_text((72, 72), f"Normativa {page}, página {number + 1}: "
+                                       f"resolución sobre matrícula y becas de la Universidad de Extremadura.")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def make_handler(spec: SiteSpec, base_url: str):
+    """Handler HTTP del sitio sintético"""
+    sitemap = ''.join(f"<url><loc>{base_url}page/{i}</loc><lastmod>2024-01-01</lastmod></url>"
+                      for i in range(spec.pages))
+    sitemap_xml = (f'<?xml version="1.0" encoding="UTF-8"?>'
+                   f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{sitemap}</urlset>').encode()
+    robots = f"User-agent: *\nDisallow: /private/\nSitemap: {base_url}sitemap.xml\n".encode()
+    pdf_cache = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(spec.latency)
+            path = urlsplit(self.path).path.rstrip('/') or '/'
+
+            if path == '/robots.txt':
+                return self.send(200, robots, 'text/plain')
+            if path == '/sitemap.xml':
+                return self.send(200, sitemap_xml, 'application/xml')
+            if path == '/':
+                return self.send(200, render_page(spec, 0), 'text/html; charset=utf-8')
+
+            if path.startswith('/page/'):
+                try:
+                    page = int(path.split('/')[2])
+                except ValueError:
+                    return self.send(404, b'not found', 'text/plain')
+                if page >= spec.pages:
+                    return self.send(404, b'not found', 'text/plain')
+                if spec.is_failing(page):
+                    return self.send(500, b'internal error', 'text/plain')
+                if spec.is_slow(page):
+                    time.sleep(spec.slow)
+                return self.send(200, render_page(spec, page), 'text/html; charset=utf-8')
+
+            if path.startswith('/docs/doc') and path.endswith('.pdf'):
+                page = int(path[len('/docs/doc'):-len('.pdf')])
+                if page not in pdf_cache:
+                    pdf_cache[page] = render_pdf(page)
+                return self.send(200, pdf_cache[page], 'application/pdf')
+
+            return self.send(404, b'not found', 'text/plain')
+
+    return Handler
+
+
+def serve(spec: SiteSpec, port_queue):
+    """Proceso servidor: el sitio corre aparte para no mezclar su CPU/RSS con la del crawler"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), None)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    server.RequestHandlerClass = make_handler(spec, base_url)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def peak_rss_mb() -> float:
+    """Pico de memoria residente de este proceso (ru_maxrss está en KB en Linux).
+
+    Es el pico de todo el proceso, por eso cada crawl corre en un proceso propio.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def check_corpus(spec: SiteSpec, corpus_path: str) -> dict:
+    """Compara el corpus con lo que el sitio sintético contiene"""
+    pages, pdfs, duplicates, failing, records = set(), set(), 0, 0, 0
+    for record in iter_corpus(corpus_path):
+        records += 1
+        path = urlsplit(canonicalize_url(record['url'])).path or '/'
+        target = pdfs if record.get('content_type') == 'pdf' else pages
+        if path in target:
+            duplicates += 1
+        target.add(path)
+        if path.startswith('/page/') and spec.is_failing(int(path.split('/')[2])):
+            failing += 1
+
+    expected_pages = spec.expected_pages()
+    expected_pdfs = spec.expected_pdfs()
+    return {
+        'records': records,
+        'page_coverage': len(pages & expected_pages) / len(expected_pages) if expected_pages else 1.0,
+        'pdf_coverage': len(pdfs & expected_pdfs) / len(expected_pdfs) if expected_pdfs else 1.0,
+        'duplicate_records': duplicates,
+        'failing_endpoints_in_corpus': failing
+    }
+
+
+def run_crawl(spec: SiteSpec, base_url: str, concurrent: bool, args, workdir: str) -> dict:
+    """Crawl completo del sitio local y métricas del resultado"""
+    label = 'concurrent' if concurrent else 'sequential'
+    corpus_path = os.path.join(workdir, f"{label}.jsonl")
+
+    scraper = EnhancedWebScraper(
+        base_url=base_url,
+        max_pages=spec.pages + 100,
+        max_pdfs=len(spec.expected_pdfs()),
+        max_concurrency=args.concurrency,
+        per_host_concurrency=args.concurrency,
+        per_host_delay=0.0,
+        cache_path=None,
+        corpus_path=corpus_path,
+        allowed_domain='127.0.0.1'
+    )
+    scraper.priority_urls = [base_url]
+    if not args.verbose:
+        logging.getLogger('web_scraper').setLevel(logging.CRITICAL)
+        logging.getLogger('sitemaps').setLevel(logging.CRITICAL)
+
+    start = time.perf_counter()
+    scraper.scrape_website(concurrent=concurrent)
+    elapsed = time.perf_counter() - start
+
+    summary = scraper.metrics.summary()
+    result = {
+        'mode': label,
+        'elapsed_s': round(elapsed, 2),
+        'urls_fetched': summary['urls'],
+        'pages_per_sec': round(scraper.records_count / elapsed, 1) if elapsed > 0 else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'errors_by_class': summary['errors_by_class'],
+        **check_corpus(spec, corpus_path)
+    }
+    scraper.metrics.export(os.path.join(workdir, f"{label}.metrics.json"), {'benchmark': result})
+    return result
+
+
+def crawl_process(spec: SiteSpec, base_url: str, concurrent: bool, args, workdir: str, result_queue):
+    """Proceso crawler: un proceso limpio por modo para que el pico RSS sea solo suyo"""
+    result_queue.put(run_crawl(spec, base_url, concurrent, args, workdir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=2000, help="Páginas HTML del sitio sintético")
+    parser.add_argument('--pdf-every', type=int, default=20, help="Una página de cada N enlaza un PDF")
+    parser.add_argument('--slow-every', type=int, default=100, help="Una página de cada N es lenta")
+    parser.add_argument('--fail-every', type=int, default=50, help="Una página de cada N devuelve 500")
+    parser.add_argument('--latency-ms', type=float, default=20.0, help="Latencia simulada por petición")
+    parser.add_argument('--slow-ms', type=float, default=1000.0, help="Latencia extra de las páginas lentas")
+    parser.add_argument('--concurrency', type=int, default=16, help="Descargas simultáneas en modo concurrente")
+    parser.add_argument('--mode', choices=['concurrent', 'sequential', 'both'], default='concurrent')
+    parser.add_argument('--verbose', action='store_true', help="Mostrar el log del crawler")
+    args = parser.parse_args()
+
+    spec = SiteSpec(args.pages, args.pdf_every, args.slow_every, args.fail_every,
+                    args.latency_ms, args.slow_ms)
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(spec, port_queue), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get(timeout=10)}/"
+    print(f"🌐 Sitio sintético en {base_url} ({spec.pages} páginas)")
+
+    modes = {'concurrent': [True], 'sequential': [False], 'both': [False, True]}[args.mode]
+    # 'spawn' y no 'fork': el hijo no hereda la memoria (ni el pico) de este proceso
+    context = multiprocessing.get_context('spawn')
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for concurrent in modes:
+                result_queue = context.Queue()
+                crawler = context.Process(target=crawl_process,
+                                          args=(spec, base_url, concurrent, args, workdir, result_queue))
+                crawler.start()
+                crawler.join()
+                if crawler.exitcode != 0:
+                    raise RuntimeError(f"El crawl en modo {'concurrente' if concurrent else 'secuencial'} "
+                                       f"terminó con código {crawler.exitcode}")
+                results.append(result_queue.get())
+    finally:
+        server.terminate()
+
+    print("\n" + "=" * 60)
+    print("🏁 RESULTADOS DEL BENCHMARK")
+    print("=" * 60)
+    for result in results:
+        print(f"[{result['mode']}] {result['elapsed_s']}s | {result['pages_per_sec']} páginas/s | "
+              f"pico RSS {result['peak_rss_mb']} MB")
+        print(f"   registros {result['records']} | cobertura páginas {result['page_coverage']:.1%} | "
+              f"cobertura PDFs {result['pdf_coverage']:.1%} | duplicados {result['duplicate_records']} | "
+              f"endpoints fallidos en corpus {result['failing_endpoints_in_corpus']}")
+        if result['errors_by_class']:
+            print(f"   errores: {result['errors_by_class']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Compara la extracción HTML clásica (varias pasadas sobre BeautifulSoup) con el
+recorrido único de EnhancedWebScraper.parse_html sobre páginas guardadas.
+
+Uso:
+    python benchmark_html_extraction.py --fetch          # guarda páginas de muestra
+    python benchmark_html_extraction.py --repeat 5       # mide sobre las guardadas
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from web_scraper import EnhancedWebScraper, DEFAULT_HTML_PARSER
+
+SAMPLES_DIR = "samples/html"
+
+
+def fetch_samples(scraper: EnhancedWebScraper, samples_dir: str):
+    """Descarga las URLs prioritarias y las guarda como páginas de muestra"""
+    os.makedirs(samples_dir, exist_ok=True)
+    index = {}
+    for url in scraper.priority_urls:
+        try:
+            response = scraper.session.get(url, timeout=15)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"⚠️ {url}: {str(e)}")
+            continue
+        filename = hashlib.md5(url.encode()).hexdigest() + ".html"
+        with open(os.path.join(samples_dir, filename), 'wb') as f:
+            f.write(response.content)
+        index[filename] = url
+        print(f"💾 {url}")
+
+    with open(os.path.join(samples_dir, "urls.json"), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+
+
+def load_samples(samples_dir: str, default_url: str):
+    """Devuelve [(url, html)] de las páginas guardadas"""
+    index_path = os.path.join(samples_dir, "urls.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+
+    samples = []
+    for filename in sorted(os.listdir(samples_dir)):
+        if filename.endswith(('.html', '.htm')):
+            with open(os.path.join(samples_dir, filename), 'rb') as f:
+                samples.append((index.get(filename, default_url), f.read()))
+    return samples
+
+
+def legacy_extract(scraper: EnhancedWebScraper, html: bytes, url: str) -> dict:
+    """Ruta anterior: html.parser + decompose + find_all/select_one + varias búsquedas de enlaces"""
+    soup = BeautifulSoup(html, 'html.parser')
+    title_elem = soup.find('title')
+    title = title_elem.get_text().strip() if title_elem else ""
+    text = scraper.extract_text_from_html(soup)
+    pdf_links = scraper.find_all_pdf_links(soup, url)
+    internal_links = []
+    for link in soup.find_all('a', href=True):
+        full_url = urljoin(url, link['href'])
+        if scraper.is_valid_unex_url(full_url) and not scraper.is_pdf_url(full_url):
+            internal_links.append(full_url)
+    return {'title': title, 'text': text, 'internal_links': internal_links, 'pdf_links': pdf_links}
+
+
+def run(label: str, extract, samples, repeat: int) -> float:
+    """Ejecuta un extractor sobre todas las muestras y devuelve el mejor tiempo"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url, html in samples:
+            extract(html, url)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<32} {best * 1000:9.1f} ms  {len(samples) / best:8.1f} páginas/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', default=SAMPLES_DIR, help="Directorio de páginas guardadas")
+    parser.add_argument('--fetch', action='store_true', help="Descargar antes las URLs prioritarias")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeticiones (se toma el mejor tiempo)")
+    args = parser.parse_args()
+
+    scraper = EnhancedWebScraper(cache_path=None)
+    if args.fetch:
+        fetch_samples(scraper, args.samples)
+
+    samples = load_samples(args.samples, scraper.base_url) if os.path.isdir(args.samples) else []
+    if not samples:
+        print(f"No hay páginas en {args.samples}. Ejecuta con --fetch primero.")
+        return
+
+    total_kb = sum(len(html) for _, html in samples) / 1024
+    print(f"📄 {len(samples)} páginas ({total_kb:,.0f} KB), mejor de {args.repeat}\n")
+
+    baseline = run("clásica (html.parser)", lambda html, url: legacy_extract(scraper, html, url),
+                   samples, args.repeat)
+
+    parsers = ['html.parser'] + ([DEFAULT_HTML_PARSER] if DEFAULT_HTML_PARSER != 'html.parser' else [])
+    for html_parser in parsers:
+        scraper.html_parser = html_parser
+        elapsed = run(f"parse_html ({html_parser})", scraper.parse_html, samples, args.repeat)
+        print(f"{'':<32} speed-up x{baseline / elapsed:.2f}")
+
+    # Comprobar que el texto extraído coincide con la ruta clásica
+    scraper.html_parser = 'html.parser'
+    mismatches = sum(
+        1 for url, html in samples
+        if scraper.parse_html(html, url)['text'] != legacy_extract(scraper, html, url)['text']
+    )
+    print(f"\n✅ Texto idéntico en {len(samples) - mismatches}/{len(samples)} páginas (html.parser)")
+
+
+if __name__ == "__main__":
+    main()
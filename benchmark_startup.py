@@ -0,0 +1,117 @@
+"""
+Mide el arranque en frío: tiempo de importar los módulos de la aplicación
+(cada uno en un proceso nuevo) frente a un presupuesto, y comprueba que no
+arrastran dependencias pesadas (torch, sentence_transformers, chromadb,
+faiss), que solo deben cargarse al primer uso o con warm_up().
+
+Sale con código 1 si algún módulo supera el presupuesto o importa una
+dependencia pesada, para poder usarlo en CI.
+
+Uso:
+    python benchmark_startup.py
+    python benchmark_startup.py --budget-ms 300 --modules chatbot knowledge_base
+    python benchmark_startup.py --warm-up
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+HEAVY_MODULES = ['torch', 'sentence_transformers', 'transformers', 'chromadb', 'faiss']
+
+# Se ejecuta en un proceso limpio para que no influyan los imports de este script
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'ms': elapsed * 1000, 'heavy': heavy}}))
+"""
+
+WARM_UP_PROBE = """
+import json, time
+start = time.perf_counter()
+from chatbot import create_chatbot
+chatbot = create_chatbot()
+created = time.perf_counter() - start
+warm_up = chatbot.warm_up()
+start = time.perf_counter()
+chatbot.knowledge_base.search("¿Cómo me matriculo?", n_results=5)
+print(json.dumps({'create_ms': created * 1000, 'warm_up_ms': warm_up * 1000,
+                  'first_query_ms': (time.perf_counter() - start) * 1000}))
+"""
+
+
+def run_probe(code: str) -> Dict:
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> List[str]:
+    """Las dependencias del módulo con más tiempo acumulado según python -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            capture_output=True, text=True)
+    rows, subtree = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Los imports anidados salen antes que su padre y con más sangría
+        if name.startswith('  '):
+            subtree.append((int(cumulative), name.strip()))
+            continue
+        if name.strip() == module:
+            rows = subtree
+        subtree = []
+    rows.sort(reverse=True)
+    return [f"{name} ({microseconds / 1000:.0f} ms)" for microseconds, name in rows[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=['chatbot', 'knowledge_base', 'web_scraper'],
+                        help="Módulos a importar")
+    parser.add_argument('--budget-ms', type=float, default=500.0, help="Tiempo máximo de import por módulo")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeticiones (se toma la mediana)")
+    parser.add_argument('--top', type=int, default=5, help="Imports más lentos que se muestran")
+    parser.add_argument('--warm-up', action='store_true',
+                        help="Mide también crear el chatbot, warm_up() y la primera consulta (carga el modelo)")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"⏱️  Presupuesto de import: {args.budget_ms:.0f} ms por módulo\n")
+    for module in args.modules:
+        try:
+            probes = [run_probe(PROBE.format(module=module, heavy=HEAVY_MODULES)) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"❌ {module}: no se pudo importar: {str(e)}")
+            failed = True
+            continue
+        median = sorted(probe['ms'] for probe in probes)[len(probes) // 2]
+        heavy = probes[0]['heavy']
+        ok = median <= args.budget_ms and not heavy
+        failed = failed or not ok
+        print(f"{'✅' if ok else '❌'} {module}: {median:.0f} ms")
+        if heavy:
+            print(f"   importa dependencias pesadas: {', '.join(heavy)}")
+        for line in slowest_imports(module, args.top):
+            print(f"   - {line}")
+
+    if args.warm_up:
+        try:
+            timings = run_probe(WARM_UP_PROBE)
+            print(f"\n🔥 Crear chatbot: {timings['create_ms']:.0f} ms | warm_up(): {timings['warm_up_ms']:.0f} ms | "
+                  f"primera consulta tras warm_up: {timings['first_query_ms']:.0f} ms")
+        except RuntimeError as e:
+            print(f"\n❌ warm_up no disponible: {str(e)}")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compara los backends vectoriales de la base de conocimiento (Chroma, FAISS
+plano, HNSW e IVF, con vectores float32, fp16 o int8) sobre vectores
+sintéticos normalizados: tiempo de construcción, latencia de consulta p50/p99,
+memoria del índice por chunk (y, aparte, la de vectors.npy en FAISS) y
+recall@k frente a la búsqueda exacta (y su pérdida respecto al mismo índice
+en float32).
+
+Uso:
+    python benchmark_vector_store.py --chunks 50000 --queries 500
+    python benchmark_vector_store.py --backends faiss-hnsw --quantization none fp16 int8
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from crawl_metrics import percentile
+from vector_store import QUANTIZATIONS, VECTOR_BACKENDS, create_store
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, rng) -> np.ndarray:
+    """Vectores unitarios agrupados en temas, parecidos a embeddings de chunks"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Vecinos exactos por producto escalar (equivale a L2 con vectores unitarios)"""
+    scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run_backend(backend: str, quantization: str, vectors: np.ndarray, queries: np.ndarray,
+                truth: np.ndarray, k: int, batch_size: int) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        store = create_store(backend, path, vectors.shape[1], 'benchmark', quantization)
+        start = time.perf_counter()
+        for i in range(0, len(vectors), batch_size):
+            batch = vectors[i:i + batch_size]
+            ids = [str(row) for row in range(i, i + len(batch))]
+            store.add(ids=ids, embeddings=batch, documents=[''] * len(batch),
+                      metadatas=[{'row': row} for row in range(i, i + len(batch))])
+        store.save()
+        build_s = time.perf_counter() - start
+
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            results = store.query(query[None, :], k)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len({result['metadata']['row'] for result in results} & set(expected.tolist()))
+
+        # Chroma no expone el tamaño de su índice: se toma el de los float32
+        memory = store.memory_bytes() if hasattr(store, 'memory_bytes') else vectors.nbytes
+        # FAISS guarda además los float32 en vectors.npy, fuera del índice
+        vectors_bytes = store.vectors_bytes() if hasattr(store, 'vectors_bytes') else None
+
+    return {
+        'backend': backend,
+        'quantization': quantization,
+        'build_s': build_s,
+        'bytes_per_chunk': memory / len(vectors),
+        'npy_bytes_per_chunk': vectors_bytes / len(vectors) if vectors_bytes is not None else None,
+        'p50_ms': percentile(latencies, 0.50),
+        'p99_ms': percentile(latencies, 0.99),
+        'recall': hits / truth.size
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=20000, help="Vectores indexados")
+    parser.add_argument('--queries', type=int, default=300, help="Consultas medidas")
+    parser.add_argument('--dim', type=int, default=384, help="Dimensión de los embeddings")
+    parser.add_argument('--k', type=int, default=8, help="Resultados por consulta")
+    parser.add_argument('--backends', nargs='+', default=VECTOR_BACKENDS, choices=VECTOR_BACKENDS)
+    parser.add_argument('--quantization', nargs='+', default=['none'], choices=QUANTIZATIONS,
+                        help="Representaciones de los vectores a comparar (solo FAISS)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_vectors(args.chunks, args.dim, max(10, args.chunks // 200), rng)
+    queries = synthetic_vectors(args.queries, args.dim, max(10, args.chunks // 200), rng)
+    truth = exact_top_k(vectors, queries, args.k)
+    print(f"📐 {args.chunks} vectores de {args.dim} dimensiones, {args.queries} consultas, k={args.k}\n")
+
+    print(f"{'backend':<12} {'vectores':<8} {'build':>9} {'p50':>9} {'p99':>9} {'bytes/chunk':>12} "
+          f"{'npy/chunk':>10} {'recall@k':>9} {'pérdida':>8}")
+    for backend in args.backends:
+        baseline = None
+        for quantization in args.quantization:
+            if backend == 'chroma' and quantization != 'none':
+                continue
+            try:
+                result = run_backend(backend, quantization, vectors, queries, truth, args.k, batch_size=256)
+            except ImportError as e:
+                print(f"{backend:<12} no disponible: {str(e)}")
+                break
+            if quantization == 'none':
+                baseline = result['recall']
+            loss = f"{baseline - result['recall']:8.3f}" if baseline is not None else f"{'-':>8}"
+            npy = (f"{result['npy_bytes_per_chunk']:10.0f}" if result['npy_bytes_per_chunk'] is not None
+                   else f"{'-':>10}")
+            print(f"{backend:<12} {quantization:<8} {result['build_s']:8.1f}s {result['p50_ms']:7.2f}ms "
+                  f"{result['p99_ms']:7.2f}ms {result['bytes_per_chunk']:12.0f} {npy} "
+                  f"{result['recall']:9.3f} {loss}")
+
+
+if __name__ == "__main__":
+    main()
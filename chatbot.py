@@ -1,12 +1,39 @@
 import os
 import re
+import time
 import logging
-from typing import List, Dict, Tuple
-from knowledge_base import KnowledgeBase
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from knowledge_base import KnowledgeBase, split_sentences
+from keyword_matcher import KeywordMatcher, trie_pattern
+from answer_cache import AnswerCache
+
+class ChatTurn:
+    """Estado de una pregunta: la búsqueda se hace una sola vez por turno y sus
+    resultados los comparten el filtro de dominio, el contexto y la respuesta"""
+    
+    def __init__(self, question: str, question_type: str = 'general', where: Optional[Dict] = None):
+        self.question = question
+        self.question_type = question_type
+        self.where = where
+        self.results: Optional[List[Dict]] = None
+        self.searches = 0
+        # Embedding de la pregunta si ya se calculó (p. ej. para la caché de respuestas)
+        self.embedding: Optional[np.ndarray] = None
+    
+    def best_score(self) -> Optional[float]:
+        """Menor distancia vectorial entre los resultados (None si solo los encontró BM25)"""
+        scores = [result['score'] for result in self.results or [] if result.get('score') is not None]
+        return min(scores) if scores else None
 
 class UExChatbot:
-    def __init__(self, hf_token: str = None):
+    def __init__(self, hf_token: str = None, answer_cache_size: int = 1000,
+                 answer_cache_ttl: float = 3600.0, answer_cache_threshold: float = 0.95):
         self.knowledge_base = KnowledgeBase()
+        # Caché de respuestas delante de chat (answer_cache_size=0 la desactiva)
+        self.answer_cache = None
+        if answer_cache_size > 0:
+            self.answer_cache = AnswerCache(answer_cache_size, answer_cache_ttl, answer_cache_threshold)
         
         # Configurar logging
         logging.basicConfig(level=logging.INFO)
@@ -35,96 +62,221 @@ class UExChatbot:
             'contacto': ['contacto', 'teléfono', 'dirección', 'email', 'donde', 'como contactar']
         }
         
+        # Palabras que marcan una frase como relevante para cada tipo de pregunta
+        self.sentence_keywords = {
+            'estudios': ['grado', 'carrera', 'titulación', 'estudio', 'oferta', 'académica'],
+            'campus': ['campus', 'badajoz', 'cáceres', 'mérida', 'plasencia', 'facultad', 'centro'],
+            'matricula': ['matrícula', 'plazo', 'inscripción', 'preinscripción', 'automatrícula', 'proceso'],
+            'pau': ['pau', 'selectividad', 'acceso', 'prueba', 'calificación'],
+            'becas': ['beca', 'ayuda', 'financiación', 'económica'],
+            'master': ['máster', 'master', 'postgrado', 'posgrado']
+        }
+        self.compile_matchers()
+        
+        # Filtros de metadatos por tipo de pregunta: se aplican en el almacén
+        # vectorial, así solo se puntúan los chunks candidatos
+        self.category_filters = {
+            'pau': {'host': 'alumnado.unex.es'}
+        }
+        # Las noticias se buscan solo en páginas obtenidas en los últimos días
+        self.news_max_age_days = 90
+        # Similitud coseno mínima de una frase con la pregunta para usarla en la respuesta
+        self.min_sentence_similarity = 0.2
+        
+        # Instrumentación: búsquedas en la base de conocimiento por turno de chat
+        self.turn_stats = {'turns': 0, 'searches': 0}
+        self.last_turn: Optional[ChatTurn] = None
+        
         self.logger.info("UEx Chatbot initialized successfully (Advanced context-based system)")
     
-    def is_uex_related(self, question: str) -> bool:
+    def compile_matchers(self):
+        """Compila los vocabularios (hay que volver a llamarlo si se modifican)"""
+        self.keyword_matcher = KeywordMatcher({'uex': self.uex_keywords})
+        self.question_matcher = KeywordMatcher(self.question_patterns)
+        self.sentence_matchers = {category: KeywordMatcher({category: words})
+                                  for category, words in self.sentence_keywords.items()}
+    
+    def warm_up(self) -> float:
+        """Carga el modelo y el índice antes de la primera pregunta (si no, se cargan al responderla)"""
+        return self.knowledge_base.warm_up()
+    
+    def start_turn(self, question: str) -> ChatTurn:
+        question_type = self.classify_question_type(question)
+        return ChatTurn(question, question_type, self.search_filter(question_type))
+    
+    def retrieve(self, turn: ChatTurn) -> List[Dict]:
+        """Resultados de la búsqueda del turno (se busca solo la primera vez)"""
+        if turn.results is None:
+            # Búsqueda híbrida: términos exactos (TFG, SIAA, automatrícula) vía BM25 + embeddings
+            turn.results = self.knowledge_base.search(turn.question, n_results=8, mode="hybrid",
+                                                      where=turn.where, query_embedding=turn.embedding)
+            turn.searches += 1
+            if turn.where and not turn.results:
+                # Nada cumple el filtro (p. ej. índice sin esos metadatos): búsqueda sin filtrar
+                turn.results = self.knowledge_base.search(turn.question, n_results=8, mode="hybrid",
+                                                          query_embedding=turn.embedding)
+                turn.searches += 1
+        return turn.results
+    
+    def is_uex_related(self, question: str, turn: Optional[ChatTurn] = None) -> bool:
         """Determina si la pregunta está relacionada con la UEx"""
-        question_lower = question.lower()
-        
         # Buscar palabras clave del dominio
-        for keyword in self.uex_keywords:
-            if keyword in question_lower:
-                return True
+        if self.keyword_matcher.search(question):
+            return True
         
-        # Buscar contenido relacionado en la base de conocimiento
-        search_results = self.knowledge_base.search(question, n_results=3)
+        # Buscar contenido relacionado en la base de conocimiento (la misma búsqueda
+        # que luego da el contexto)
+        if turn is None:
+            turn = self.start_turn(question)
+        self.retrieve(turn)
+        best_score = turn.best_score()
         
-        # Si encuentra resultados relevantes, considerar que está relacionado
-        if search_results and len(search_results) > 0:
-            # Verificar si el primer resultado tiene una puntuación razonable
-            if search_results[0].get('score', 1.0) < 0.8:  # Umbral de similitud
-                return True
+        # Si el resultado más cercano tiene una puntuación razonable, está relacionado
+        if best_score is not None and best_score < 0.8:  # Umbral de similitud
+            return True
         
         return False
     
     def classify_question_type(self, question: str) -> str:
         """Clasifica el tipo de pregunta para dar una respuesta más específica"""
-        question_lower = question.lower()
-        
-        for category, patterns in self.question_patterns.items():
-            for pattern in patterns:
-                if pattern in question_lower:
-                    return category
+        # Una pasada encuentra todas las categorías; gana la primera en el orden del dict
+        hits = self.question_matcher.categories(question)
+        for category in self.question_patterns:
+            if category in hits:
+                return category
         
         return 'general'
     
-    def get_context(self, question: str, max_context_length: int = 3000) -> List[Dict]:
+    def search_filter(self, question_type: str) -> Optional[Dict]:
+        """Filtro `where` de la búsqueda para un tipo de pregunta (None = sin filtro)"""
+        if question_type == 'noticias':
+            # Redondeado al día para que el filtro (y su caché en el almacén) no cambie en cada pregunta
+            cutoff = (int(time.time()) // 86400 - self.news_max_age_days) * 86400
+            return {'scraped_at': {'$gte': cutoff}}
+        return self.category_filters.get(question_type)
+    
+    def get_context(self, question: str, max_context_length: int = 3000,
+                    turn: Optional[ChatTurn] = None) -> List[Dict]:
         """Obtiene contexto relevante de la base de conocimiento"""
-        search_results = self.knowledge_base.search(question, n_results=8)
+        search_results = self.retrieve(turn or self.start_turn(question))
         
         filtered_results = []
         total_length = 0
         
         for result in search_results:
-            content = result['content']
-            # Limpiar y mejorar el contenido
-            content = self.clean_content(content)
+            # Contenido limpio a partir de las frases precalculadas al indexar
+            sentences = self.result_sentences(result)
+            content = '. '.join(sentences)
             
             if content and len(content) > 50:  # Solo contenido significativo
                 if total_length + len(content) < max_context_length:
-                    result['content'] = content
-                    filtered_results.append(result)
+                    # Copia: los resultados del turno no se modifican
+                    filtered_results.append(dict(result, content=content, sentences=sentences))
                     total_length += len(content)
                 else:
                     # Añadir parte del contenido que quepa
                     remaining_space = max_context_length - total_length
                     if remaining_space > 200:
-                        truncated_result = result.copy()
-                        truncated_result['content'] = content[:remaining_space]
-                        filtered_results.append(truncated_result)
+                        filtered_results.append(dict(result, content=content[:remaining_space],
+                                                     sentences=self.truncate_sentences(sentences, remaining_space)))
                     break
         
         return filtered_results
     
     def clean_content(self, content: str) -> str:
         """Limpia y mejora el contenido extraído"""
-        # Eliminar múltiples espacios en blanco
-        content = re.sub(r'\s+', ' ', content)
-        
-        # Eliminar caracteres de control y extraños
-        content = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', content)
-        
-        # Eliminar fragmentos muy cortos
-        sentences = content.split('.')
-        cleaned_sentences = []
-        
+        return '. '.join(split_sentences(content))
+    
+    def result_sentences(self, result: Dict) -> List[str]:
+        """Frases limpias de un resultado: las de get_context, las de la tabla guardada
+        al indexar o, con un índice anterior a ella, calculadas aquí"""
+        if 'sentences' in result:
+            return result['sentences']
+        table = (result.get('metadata') or {}).get('sentences')
+        if table is not None:
+            return table.split('\n') if table else []
+        return split_sentences(result['content'])
+    
+    @staticmethod
+    def truncate_sentences(sentences: List[str], max_length: int) -> List[str]:
+        """Las frases de '. '.join(sentences)[:max_length] (la última, cortada)"""
+        kept = []
+        length = 0
         for sentence in sentences:
-            sentence = sentence.strip()
-            if len(sentence) > 15 and not sentence.startswith(('http', 'www')):
-                cleaned_sentences.append(sentence)
-        
-        return '. '.join(cleaned_sentences)
+            if length >= max_length:
+                break
+            if length + len(sentence) > max_length:
+                kept.append(sentence[:max_length - length].strip())
+                break
+            kept.append(sentence)
+            length += len(sentence) + 2
+        return [sentence for sentence in kept if sentence]
+    
+    def rank_sentences(self, content_list: List[Dict], question: str,
+                       query_embedding: Optional[np.ndarray] = None, top_k: int = 5) -> Optional[List[str]]:
+        """Las top_k frases más parecidas a la pregunta, de mejor a peor.
+        
+        Usa los embeddings de frase guardados al indexar: un producto de matrices
+        puntúa todas las frases candidatas a la vez y argpartition elige las mejores.
+        Devuelve None si algún resultado no los tiene (índice anterior a ellos).
+        """
+        if not content_list:
+            return None
+        tables = [self.result_sentences(item) for item in content_list]
+        stored = [self.knowledge_base.sentence_embeddings(item['id']) if 'id' in item else None
+                  for item in content_list]
+        # get_context puede haber recortado la última frase: se usa el vector de la frase entera
+        if any(vectors is None or len(vectors) < len(sentences) for vectors, sentences in zip(stored, tables)):
+            return None
+        if query_embedding is None:
+            query_embedding = self.knowledge_base.embed([question])[0]
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        
+        texts = []
+        blocks = []
+        for sentences, vectors in zip(tables, stored):
+            keep = [i for i in range(len(sentences)) if len(sentences[i]) >= 20]
+            texts.extend(sentences[i] for i in keep)
+            blocks.append(vectors[keep])
+        if not texts:
+            return []
+        
+        matrix = np.concatenate(blocks).astype(np.float32)
+        scores = (matrix @ query) / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+        # Margen para descartar frases repetidas (los chunks se solapan)
+        k = min(len(texts), top_k * 3)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        ranked = []
+        for i in top:
+            if scores[i] < self.min_sentence_similarity:
+                break
+            if texts[i] not in ranked:
+                ranked.append(texts[i])
+                if len(ranked) == top_k:
+                    break
+        return ranked
     
-    def extract_key_information(self, content_list: List[Dict], question_type: str, question: str) -> List[str]:
+    def extract_key_information(self, content_list: List[Dict], question_type: str, question: str,
+                                query_embedding: Optional[np.ndarray] = None) -> List[str]:
         """Extrae información clave del contenido basado en el tipo de pregunta"""
+        # Con embeddings de frase: las más parecidas a la pregunta
+        ranked = self.rank_sentences(content_list, question, query_embedding)
+        if ranked is not None:
+            return ranked
+        
+        # Sin ellos: filtros de palabras por tipo de pregunta, en orden del documento
         key_info = []
         question_words = set(question.lower().split())
+        sentence_matcher = self.sentence_matchers.get(question_type)
+        # Palabras largas de la pregunta, buscadas en una pasada por frase
+        long_words = [word for word in question_words if len(word) > 5]
+        long_words_pattern = re.compile(trie_pattern(long_words)) if long_words else None
         
         for content_item in content_list:
-            content = content_item['content']
-            sentences = content.split('.')
-            
-            for sentence in sentences:
+            for sentence in self.result_sentences(content_item):
                 sentence = sentence.strip()
                 if len(sentence) < 20:
                     continue
@@ -132,29 +284,15 @@ class UExChatbot:
                 sentence_lower = sentence.lower()
                 
                 # Filtros específicos por tipo de pregunta
-                if question_type == 'estudios':
-                    if any(word in sentence_lower for word in ['grado', 'carrera', 'titulación', 'estudio', 'oferta', 'académica']):
-                        key_info.append(sentence)
-                elif question_type == 'campus':
-                    if any(word in sentence_lower for word in ['campus', 'badajoz', 'cáceres', 'mérida', 'plasencia', 'facultad', 'centro']):
-                        key_info.append(sentence)
-                elif question_type == 'matricula':
-                    if any(word in sentence_lower for word in ['matrícula', 'plazo', 'inscripción', 'preinscripción', 'automatrícula', 'proceso']):
-                        key_info.append(sentence)
-                elif question_type == 'pau':
-                    if any(word in sentence_lower for word in ['pau', 'selectividad', 'acceso', 'prueba', 'calificación']):
-                        key_info.append(sentence)
-                elif question_type == 'becas':
-                    if any(word in sentence_lower for word in ['beca', 'ayuda', 'financiación', 'económica']):
-                        key_info.append(sentence)
-                elif question_type == 'master':
-                    if any(word in sentence_lower for word in ['máster', 'master', 'postgrado', 'posgrado']):
+                if sentence_matcher is not None:
+                    if sentence_matcher.search(sentence):
                         key_info.append(sentence)
                 else:
                     # Para preguntas generales, buscar coincidencias de palabras
                     sentence_words = set(sentence_lower.split())
                     common_words = question_words.intersection(sentence_words)
-                    if len(common_words) >= 2 or any(len(word) > 5 and word in sentence_lower for word in question_words):
+                    if len(common_words) >= 2 or (long_words_pattern is not None
+                                                  and long_words_pattern.search(sentence_lower)):
                         key_info.append(sentence)
         
         # Eliminar duplicados manteniendo el orden
@@ -167,14 +305,15 @@ class UExChatbot:
         
         return unique_info[:5]  # Máximo 5 fragmentos clave
     
-    def generate_structured_response(self, question: str, context_results: List[Dict], question_type: str) -> str:
+    def generate_structured_response(self, question: str, context_results: List[Dict], question_type: str,
+                                     query_embedding: Optional[np.ndarray] = None) -> str:
         """Genera una respuesta estructurada basada en el contexto"""
         
         if not context_results:
             return self.get_default_response(question_type)
         
         # Extraer información clave
-        key_info = self.extract_key_information(context_results, question_type, question)
+        key_info = self.extract_key_information(context_results, question_type, question, query_embedding)
         
         if not key_info:
             return self.generate_basic_response(context_results, question_type)
@@ -213,8 +352,7 @@ class UExChatbot:
             response += "**Información adicional:**\n"
             additional_info = []
             for result in context_results[1:3]:  # Usar 2-3 resultados adicionales
-                content = result['content']
-                sentences = content.split('.')[:2]  # Primeras 2 oraciones
+                sentences = self.result_sentences(result)[:2]  # Primeras 2 oraciones
                 for sentence in sentences:
                     sentence = sentence.strip()
                     if len(sentence) > 30 and sentence not in response:
@@ -238,8 +376,7 @@ class UExChatbot:
             return self.get_default_response(question_type)
         
         # Usar el primer resultado como base
-        main_content = context_results[0]['content']
-        sentences = [s.strip() for s in main_content.split('.') if len(s.strip()) > 30]
+        sentences = [s for s in self.result_sentences(context_results[0]) if len(s) > 30]
         
         response = "Según la información disponible de la Universidad de Extremadura:\\n\\n"
         
@@ -333,23 +470,62 @@ Pregúntame sobre cualquier aspecto específico de la Universidad de Extremadura
         }
         return defaults.get(question_type, defaults['general'])
     
+    def search_stats(self) -> Dict:
+        """Búsquedas en la base de conocimiento por turno (debería ser como mucho 1)"""
+        turns = self.turn_stats['turns']
+        return dict(self.turn_stats,
+                    searches_per_turn=round(self.turn_stats['searches'] / turns, 2) if turns else 0.0)
+    
+    def cache_stats(self) -> Dict:
+        """Aciertos (exactos y por similitud), tasa de acierto y segundos ahorrados"""
+        return self.answer_cache.stats() if self.answer_cache is not None else {}
+    
     def chat(self, question: str) -> str:
         """Función principal del chatbot"""
-        # Verificar si la pregunta está relacionada con la UEx
-        if not self.is_uex_related(question):
-            return ("Lo siento, solo puedo responder preguntas relacionadas con la "
-                   "Universidad de Extremadura. ¿Tienes alguna consulta sobre la UEx?")
-        
-        # Clasificar tipo de pregunta
-        question_type = self.classify_question_type(question)
-        
-        # Obtener contexto relevante
-        context_results = self.get_context(question)
-        
-        # Generar respuesta estructurada
-        response = self.generate_structured_response(question, context_results, question_type)
-        
+        if self.answer_cache is None:
+            return self.answer(question, self.start_turn(question))
+        
+        start = time.perf_counter()
+        # Las respuestas cacheadas dejan de valer en cuanto se reindexa
+        index_version = self.knowledge_base.index_version()
+        cached = self.answer_cache.get(question, index_version)
+        if cached is not None:
+            return cached
+        
+        # El embedding de la pregunta sirve para la caché y para la búsqueda del turno
+        turn = self.start_turn(question)
+        turn.embedding = self.knowledge_base.embed([question])[0]
+        cached = self.answer_cache.get_similar(turn.embedding, turn.question_type, index_version)
+        if cached is not None:
+            return cached
+        
+        response = self.answer(question, turn)
+        self.answer_cache.put(question, turn.embedding, turn.question_type, response,
+                              time.perf_counter() - start, index_version)
         return response
+    
+    def answer(self, question: str, turn: ChatTurn) -> str:
+        """Responde sin pasar por la caché; la búsqueda del turno se hace como mucho una vez"""
+        self.last_turn = turn
+        if turn.embedding is None:
+            # Lo usan la búsqueda y la puntuación de frases
+            turn.embedding = self.knowledge_base.embed([question])[0]
+        try:
+            # Verificar si la pregunta está relacionada con la UEx
+            if not self.is_uex_related(question, turn):
+                return ("Lo siento, solo puedo responder preguntas relacionadas con la "
+                       "Universidad de Extremadura. ¿Tienes alguna consulta sobre la UEx?")
+            
+            # Obtener contexto relevante (reutiliza los resultados del filtro de dominio)
+            context_results = self.get_context(question, turn=turn)
+            
+            # Generar respuesta estructurada
+            return self.generate_structured_response(question, context_results, turn.question_type,
+                                                     turn.embedding)
+        finally:
+            self.turn_stats['turns'] += 1
+            self.turn_stats['searches'] += turn.searches
+            self.logger.debug(f"Turn answered with {turn.searches} knowledge base search(es)")
 
 # Función para crear una instancia del chatbot
 def create_chatbot(hf_token: str = None) -> UExChatbot:
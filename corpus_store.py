@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import logging
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CorpusWriter:
+    """Escribe el corpus como JSONL (un registro por línea) a medida que se extrae"""
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.lock = threading.Lock()
+
+        if append and os.path.exists(path):
+            self.truncate_partial_line()
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def truncate_partial_line(self):
+        """Elimina una última línea a medias (p. ej. tras un corte en mitad de una escritura)"""
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+
+            # Retroceder hasta el último salto de línea completo
+            pos = size - 1
+            while pos > 0:
+                f.seek(pos - 1)
+                if f.read(1) == b'\n':
+                    break
+                pos -= 1
+            f.truncate(pos)
+            logger.warning(f"Descartada línea incompleta al final de {self.path}")
+
+    def write(self, record: dict):
+        """Añade un registro y lo vuelca a disco"""
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                os.fsync(self.file.fileno())
+                self.file.close()
+
+
+def iter_corpus(path: str) -> Iterator[dict]:
+    """Recorre el corpus registro a registro.
+
+    Acepta el formato JSONL y, por compatibilidad, los JSON antiguos
+    (lista de páginas o {'scraping_stats': ..., 'content': [...]}), que sí
+    deben cargarse enteros.
+    """
+    if path.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning(f"Línea {line_number} inválida en {path}, se ignora")
+        return
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict) and 'content' in data:
+        yield from data['content']
+    else:
+        yield from data
+
+
+def save_checkpoint(path: str, state: Dict):
+    """Guarda el estado del crawl de forma atómica"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> Optional[Dict]:
+    """Carga el último checkpoint, o None si no existe o está dañado"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Checkpoint {path} ilegible, se ignora: {str(e)}")
+        return None
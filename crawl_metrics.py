@@ -0,0 +1,201 @@
+"""
+Instrumentación del crawler: tiempos por URL y por etapa, bytes transferidos,
+throughput, histogramas de latencia por host y tipo de contenido, y errores
+agrupados por clase de excepción. Se exporta como JSON junto al corpus.
+"""
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+# Límites superiores (ms) de los cubos de los histogramas de latencia
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Percentil por el método del rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def histogram(values_ms: List[float]) -> Dict[str, int]:
+    """Cuenta de valores por cubo de LATENCY_BUCKETS_MS"""
+    counts = Counter()
+    for value in values_ms:
+        for bound in LATENCY_BUCKETS_MS:
+            if value <= bound:
+                counts[f"<={bound}ms"] += 1
+                break
+        else:
+            counts[f">{LATENCY_BUCKETS_MS[-1]}ms"] += 1
+    labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+    return {label: counts[label] for label in labels if counts[label]}
+
+
+def latency_summary(values_ms: List[float]) -> dict:
+    return {
+        'count': len(values_ms),
+        'p50_ms': round(percentile(values_ms, 0.50), 1),
+        'p90_ms': round(percentile(values_ms, 0.90), 1),
+        'p99_ms': round(percentile(values_ms, 0.99), 1),
+        'max_ms': round(max(values_ms), 1) if values_ms else 0.0,
+        'histogram': histogram(values_ms)
+    }
+
+
+class CrawlMetrics:
+    """Recoge métricas por URL; las etapas se asocian a la URL en curso de cada hilo"""
+
+    def __init__(self, throughput_interval: float = 10.0):
+        self.throughput_interval = throughput_interval
+        self.records: List[dict] = []
+        self.errors: Counter = Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started_at = time.time()
+        self.start_clock = time.monotonic()
+        self.finished_at: Optional[float] = None
+
+    def reset(self):
+        """Empieza una medición nueva (al iniciar un crawl)"""
+        with self.lock:
+            self.records = []
+            self.errors = Counter()
+            self.started_at = time.time()
+            self.start_clock = time.monotonic()
+            self.finished_at = None
+
+    @contextmanager
+    def track(self, url: str, content_type: str):
+        """Mide el procesamiento completo de una URL en el hilo actual"""
+        record = {
+            'url': url,
+            'host': urlparse(url).netloc,
+            'content_type': content_type,
+            'outcome': 'ok',
+            'status': None,
+            'bytes': 0,
+            'stages': {},
+            'started': time.monotonic() - self.start_clock
+        }
+        previous = getattr(self.local, 'record', None)
+        self.local.record = record
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            self.set_error(e)
+            raise
+        finally:
+            record['total_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            record['finished'] = time.monotonic() - self.start_clock
+            self.local.record = previous
+            with self.lock:
+                self.records.append(record)
+
+    def current(self) -> Optional[dict]:
+        return getattr(self.local, 'record', None)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Acumula el tiempo de una etapa (ttfb, download, parse, extract, pdf_extract)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.current()
+            if record is not None:
+                elapsed = (time.perf_counter() - start) * 1000
+                record['stages'][name] = round(record['stages'].get(name, 0.0) + elapsed, 2)
+
+    def add_stage(self, name: str, elapsed_ms: float):
+        """Registra una etapa medida externamente"""
+        record = self.current()
+        if record is not None:
+            record['stages'][name] = round(record['stages'].get(name, 0.0) + elapsed_ms, 2)
+
+    def set_response(self, status: int, size: int):
+        record = self.current()
+        if record is not None:
+            record['status'] = status
+            record['bytes'] += size
+
+    def set_outcome(self, outcome: str):
+        record = self.current()
+        if record is not None:
+            record['outcome'] = outcome
+
+    def set_error(self, error: BaseException):
+        """Marca la URL en curso como fallida y cuenta el error por clase"""
+        error_class = type(error).__name__
+        with self.lock:
+            self.errors[error_class] += 1
+        record = self.current()
+        if record is not None:
+            record['outcome'] = 'error'
+            record['error'] = f"{error_class}: {error}"
+
+    def finish(self):
+        self.finished_at = time.time()
+
+    def throughput(self) -> List[dict]:
+        """URLs completadas por segundo en intervalos de throughput_interval"""
+        buckets = Counter(int(record['finished'] // self.throughput_interval) for record in self.records)
+        if not buckets:
+            return []
+        return [
+            {
+                'from_s': index * self.throughput_interval,
+                'urls': buckets[index],
+                'urls_per_sec': round(buckets[index] / self.throughput_interval, 2)
+            }
+            for index in range(max(buckets) + 1)
+        ]
+
+    def summary(self) -> dict:
+        """Agregados del crawl"""
+        with self.lock:
+            records = list(self.records)
+            errors = dict(self.errors)
+
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        by_host = defaultdict(list)
+        by_type = defaultdict(list)
+        stage_totals = defaultdict(float)
+        outcomes = Counter()
+        for record in records:
+            by_host[record['host']].append(record['total_ms'])
+            by_type[record['content_type']].append(record['total_ms'])
+            outcomes[record['outcome']] += 1
+            for stage, value in record['stages'].items():
+                stage_totals[stage] += value
+
+        total_bytes = sum(record['bytes'] for record in records)
+        return {
+            'started_at': self.started_at,
+            'elapsed_s': round(elapsed, 2),
+            'urls': len(records),
+            'urls_per_sec': round(len(records) / elapsed, 2) if elapsed > 0 else 0.0,
+            'bytes': total_bytes,
+            'bytes_per_sec': round(total_bytes / elapsed, 1) if elapsed > 0 else 0.0,
+            'outcomes': dict(outcomes),
+            'errors_by_class': errors,
+            'stage_totals_ms': {stage: round(value, 1) for stage, value in stage_totals.items()},
+            'latency_by_content_type': {key: latency_summary(values) for key, values in by_type.items()},
+            'latency_by_host': {key: latency_summary(values) for key, values in by_host.items()},
+            'throughput': self.throughput()
+        }
+
+    def export(self, path: str, extra: Optional[dict] = None):
+        """Escribe el informe (resumen + registros por URL) como JSON"""
+        report = {'summary': self.summary(), 'urls': list(self.records)}
+        if extra:
+            report.update(extra)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
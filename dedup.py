@@ -0,0 +1,174 @@
+"""
+Deduplicación del corpus antes de indexarlo en la base de conocimiento.
+
+Tres filtros, aplicados en este orden a cada página:
+1. Boilerplate: frases que se repiten en varias páginas (avisos de cookies,
+   bloques de contacto, teasers de noticias) se conservan solo en la primera.
+2. Duplicados exactos: hash del texto normalizado.
+3. Casi duplicados: SimHash de 64 bits sobre shingles de palabras con un
+   índice LSH por bandas (distancia de Hamming <= max_hamming).
+"""
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Set
+import numpy as np
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+WORD_PATTERN = re.compile(r'\w+')
+BIT_POSITIONS = np.arange(64, dtype=np.uint64)
+BIT_VALUES = np.uint64(1) << BIT_POSITIONS
+
+
+def hash64(text: str) -> int:
+    """Hash estable de 64 bits"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def normalize(text: str) -> str:
+    """Texto en minúsculas y con espacios colapsados, para comparar"""
+    return ' '.join(text.lower().split())
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """SimHash de 64 bits sobre shingles de `shingle_size` palabras"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    # Matriz shingles x 64 bits: cada bit del resultado es 1 si está activo en más de la mitad
+    hashes = np.fromiter((hash64(shingle) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    bits = (hashes[:, None] >> BIT_POSITIONS) & np.uint64(1)
+    majority = bits.sum(axis=0) * 2 > len(shingles)
+    return int(np.bitwise_or.reduce(BIT_VALUES[majority], initial=np.uint64(0)))
+
+
+class CorpusDeduplicator:
+    """Filtra duplicados y boilerplate de un corpus de páginas extraídas"""
+
+    def __init__(self, boilerplate_min_pages: int = 3, min_sentence_length: int = 20,
+                 max_hamming: int = 3, bands: int = 4, min_content_length: int = 50):
+        self.boilerplate_min_pages = boilerplate_min_pages
+        self.min_sentence_length = min_sentence_length
+        self.max_hamming = max_hamming
+        # Con max_hamming < bands, dos huellas cercanas coinciden en al menos una banda
+        self.bands = bands
+        self.band_bits = 64 // bands
+        self.min_content_length = min_content_length
+        self.logger = logging.getLogger(__name__)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {
+            'input_docs': 0,
+            'output_docs': 0,
+            'exact_duplicates': 0,
+            'near_duplicates': 0,
+            'emptied_by_boilerplate': 0,
+            'boilerplate_sentences': 0,
+            'boilerplate_removed': 0,
+            'chars_in': 0,
+            'chars_out': 0
+        }
+
+    def split_sentences(self, text: str) -> List[str]:
+        return SENTENCE_SPLIT.split(text)
+
+    def count_sentences(self, records: Iterable[dict]) -> Set[int]:
+        """Primera pasada: hashes de las frases presentes en boilerplate_min_pages páginas o más"""
+        page_counts: Dict[int, int] = defaultdict(int)
+        for record in records:
+            content = record.get('content')
+            if not content:
+                continue
+            page_sentences = {
+                hash64(normalize(sentence)) for sentence in self.split_sentences(content)
+                if len(sentence) >= self.min_sentence_length
+            }
+            for sentence_hash in page_sentences:
+                page_counts[sentence_hash] += 1
+
+        return {h for h, count in page_counts.items() if count >= self.boilerplate_min_pages}
+
+    def filter(self, records_factory: Callable[[], Iterable[dict]]) -> Iterator[dict]:
+        """Segunda pasada: devuelve las páginas sin boilerplate repetido ni duplicados.
+
+        `records_factory` se llama dos veces (una por pasada), así que puede
+        devolver un generador sobre el corpus en disco.
+        """
+        self.reset_stats()
+        boilerplate = self.count_sentences(records_factory())
+        self.stats['boilerplate_sentences'] = len(boilerplate)
+
+        seen_boilerplate: Set[int] = set()
+        seen_hashes: Set[int] = set()
+        lsh_buckets: Dict[tuple, List[int]] = defaultdict(list)
+        band_mask = (1 << self.band_bits) - 1
+
+        for record in records_factory():
+            content = record.get('content')
+            if not content:
+                continue
+            self.stats['input_docs'] += 1
+            self.stats['chars_in'] += len(content)
+
+            # 1. Quitar frases repetidas salvo en su primera aparición
+            kept = []
+            for sentence in self.split_sentences(content):
+                if len(sentence) >= self.min_sentence_length:
+                    sentence_hash = hash64(normalize(sentence))
+                    if sentence_hash in boilerplate:
+                        if sentence_hash in seen_boilerplate:
+                            self.stats['boilerplate_removed'] += 1
+                            continue
+                        seen_boilerplate.add(sentence_hash)
+                kept.append(sentence)
+            content = ' '.join(kept)
+
+            if len(content) < self.min_content_length:
+                self.stats['emptied_by_boilerplate'] += 1
+                continue
+
+            # 2. Duplicados exactos
+            content_hash = hash64(normalize(content))
+            if content_hash in seen_hashes:
+                self.stats['exact_duplicates'] += 1
+                continue
+            seen_hashes.add(content_hash)
+
+            # 3. Casi duplicados: candidatos por banda, confirmados por distancia de Hamming
+            fingerprint = simhash(content)
+            band_keys = [(band, fingerprint >> (band * self.band_bits) & band_mask)
+                         for band in range(self.bands)]
+            is_near_duplicate = any(
+                bin(fingerprint ^ other).count('1') <= self.max_hamming
+                for key in band_keys for other in lsh_buckets.get(key, ())
+            )
+            if is_near_duplicate:
+                self.stats['near_duplicates'] += 1
+                continue
+            for key in band_keys:
+                lsh_buckets[key].append(fingerprint)
+
+            self.stats['output_docs'] += 1
+            self.stats['chars_out'] += len(content)
+            if content != record['content']:
+                record = dict(record, content=content, word_count=len(content.split()))
+            yield record
+
+        self.log_stats()
+
+    def log_stats(self):
+        """Resume el resultado de la deduplicación"""
+        stats = self.stats
+        reduction = 1 - stats['chars_out'] / stats['chars_in'] if stats['chars_in'] else 0.0
+        self.logger.info(
+            f"Dedup: {stats['input_docs']} -> {stats['output_docs']} docs "
+            f"({stats['exact_duplicates']} exact, {stats['near_duplicates']} near-duplicate, "
+            f"{stats['emptied_by_boilerplate']} only boilerplate); "
+            f"{stats['boilerplate_removed']} repeated sentences removed "
+            f"({stats['boilerplate_sentences']} distinct); text reduced {reduction:.1%}"
+        )
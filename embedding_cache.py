@@ -0,0 +1,168 @@
+import json
+import os
+import hashlib
+import threading
+import logging
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+class EmbeddingCache:
+    """Caché persistente de embeddings de chunks.
+
+    Los vectores se guardan en una matriz float32 mapeada en memoria
+    (`embeddings.f32`) y un índice JSON asocia hash(modelo + texto normalizado)
+    a su fila. Cuando se alcanza max_entries se expulsan las filas usadas hace
+    más tiempo (LRU) y se reaprovechan. Cada fila guarda además los primeros
+    64 bits de su clave (`keys.u64`), así un índice desfasado tras una caída
+    nunca devuelve el vector de otro texto.
+    """
+
+    def __init__(self, path: str = "embedding_cache", dim: int = 384, max_entries: int = 200000):
+        self.path = path
+        self.dim = dim
+        self.max_entries = max_entries
+        self.matrix_path = os.path.join(path, "embeddings.f32")
+        self.keys_path = os.path.join(path, "keys.u64")
+        self.index_path = os.path.join(path, "index.json")
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        # clave -> [fila, último uso]
+        self.rows: Dict[str, List[int]] = {}
+        self.free_rows: List[int] = []
+        self.capacity = 0
+        self.tick = 0
+        self.matrix = None
+        self.row_keys = None
+
+        # Estadísticas de la ejecución actual
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.load()
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        """Clave de un texto para un modelo (espacios colapsados)"""
+        normalized = ' '.join(text.split())
+        return hashlib.sha1(f"{model_name}\n{normalized}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def key_tag(key: str) -> int:
+        return int(key[:16], 16)
+
+    def open_arrays(self):
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+',
+                                shape=(self.capacity, self.dim))
+        self.row_keys = np.memmap(self.keys_path, dtype=np.uint64, mode='r+', shape=(self.capacity,))
+
+    def load(self):
+        """Abre la caché de disco si existe y es compatible"""
+        os.makedirs(self.path, exist_ok=True)
+        index = None
+        if all(os.path.exists(path) for path in (self.index_path, self.matrix_path, self.keys_path)):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Unreadable embedding cache index {self.index_path}: {str(e)}")
+
+        if index and index.get('dim') == self.dim:
+            self.rows = index['rows']
+            self.free_rows = index['free_rows']
+            self.tick = index['tick']
+            self.capacity = min(os.path.getsize(self.matrix_path) // (self.dim * 4),
+                                os.path.getsize(self.keys_path) // 8)
+            if self.capacity:
+                self.open_arrays()
+            self.logger.info(f"Embedding cache loaded: {len(self.rows)} vectors")
+        else:
+            # Sin índice o con otra dimensión: se empieza de cero
+            open(self.matrix_path, 'wb').close()
+            open(self.keys_path, 'wb').close()
+
+    def save(self):
+        """Vuelca las matrices y guarda el índice de forma atómica"""
+        with self.lock:
+            if self.matrix is not None:
+                self.matrix.flush()
+                self.row_keys.flush()
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'dim': self.dim, 'tick': self.tick, 'rows': self.rows,
+                           'free_rows': self.free_rows}, f)
+            os.replace(tmp_path, self.index_path)
+
+    def grow(self, needed: int):
+        """Amplía los archivos de la caché (duplicando, hasta max_entries)"""
+        new_capacity = min(self.max_entries, max(needed, self.capacity * 2, 1024))
+        if new_capacity <= self.capacity:
+            return
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.row_keys.flush()
+            self.matrix = self.row_keys = None
+        with open(self.matrix_path, 'r+b') as f:
+            f.truncate(new_capacity * self.dim * 4)
+        with open(self.keys_path, 'r+b') as f:
+            f.truncate(new_capacity * 8)
+        self.free_rows.extend(reversed(range(self.capacity, new_capacity)))
+        self.capacity = new_capacity
+        self.open_arrays()
+
+    def evict(self, count: int):
+        """Libera las `count` filas usadas hace más tiempo (como mínimo un 10%)"""
+        count = max(count, self.max_entries // 10)
+        oldest = sorted(self.rows.items(), key=lambda item: item[1][1])[:count]
+        for key, (row, _) in oldest:
+            del self.rows[key]
+            self.free_rows.append(row)
+        self.evictions += len(oldest)
+
+    def lookup(self, keys: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """Vectores de las claves cacheadas y posiciones de las que faltan"""
+        vectors = np.zeros((len(keys), self.dim), dtype=np.float32)
+        missing = []
+        with self.lock:
+            for position, key in enumerate(keys):
+                entry = self.rows.get(key)
+                if entry is not None and (entry[0] >= self.capacity
+                                          or int(self.row_keys[entry[0]]) != self.key_tag(key)):
+                    # Fila reutilizada por otra clave sin que se guardara el índice
+                    del self.rows[key]
+                    entry = None
+                if entry is None:
+                    missing.append(position)
+                    continue
+                self.tick += 1
+                entry[1] = self.tick
+                vectors[position] = self.matrix[entry[0]]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return vectors, missing
+
+    def store(self, keys: List[str], vectors: np.ndarray):
+        """Guarda vectores nuevos, expulsando entradas antiguas si no caben"""
+        with self.lock:
+            # Una fila por clave aunque se repita en el lote (frases de cabecera, boilerplate...)
+            unique = dict(zip(keys, vectors))
+            new_keys = [(key, vector) for key, vector in unique.items() if key not in self.rows]
+            if len(new_keys) > self.max_entries:
+                new_keys = new_keys[-self.max_entries:]
+            if len(self.free_rows) < len(new_keys):
+                self.grow(len(self.rows) + len(new_keys))
+            if len(self.free_rows) < len(new_keys):
+                self.evict(len(new_keys) - len(self.free_rows))
+
+            for key, vector in new_keys:
+                row = self.free_rows.pop()
+                self.tick += 1
+                self.matrix[row] = vector
+                self.row_keys[row] = self.key_tag(key)
+                self.rows[key] = [row, self.tick]
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self.rows)}
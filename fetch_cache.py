@@ -0,0 +1,123 @@
+import json
+import os
+import time
+import hashlib
+import threading
+import logging
+from typing import Dict, Optional
+
+
+class FetchCache:
+    """Caché persistente de descargas indexada por URL canónica.
+
+    Guarda los validadores HTTP (ETag / Last-Modified), el hash del contenido
+    descargado y el registro ya extraído, para poder reutilizarlo cuando el
+    servidor responde 304 o el contenido no ha cambiado.
+    """
+
+    def __init__(self, path: str = "fetch_cache.json"):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        # Estadísticas de la ejecución actual
+        self.not_modified = 0
+        self.unchanged = 0
+        self.lastmod_skipped = 0
+        self.bytes_saved = 0
+
+        self.load()
+
+    def load(self):
+        """Carga la caché desde disco si existe"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+            self.logger.info(f"🗂️ Caché de descargas cargada: {len(self.entries)} URLs")
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"No se pudo leer la caché {self.path}: {str(e)}")
+            self.entries = {}
+
+    def save(self):
+        """Guarda la caché de forma atómica (archivo temporal + rename)"""
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def content_hash(content: bytes) -> str:
+        """Hash del cuerpo de la respuesta"""
+        return hashlib.sha1(content).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Devuelve la entrada cacheada para una URL canónica"""
+        with self.lock:
+            return self.entries.get(key)
+
+    def conditional_headers(self, key: str) -> Dict[str, str]:
+        """Cabeceras If-None-Match / If-Modified-Since para una URL cacheada"""
+        entry = self.get(key)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, key: str, response, content_hash: str, record: Optional[dict],
+              lastmod: Optional[str] = None):
+        """Guarda validadores, hash y registro extraído de una descarga"""
+        with self.lock:
+            self.entries[key] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'lastmod': lastmod,
+                'content_hash': content_hash,
+                'size': len(response.content),
+                'record': record,
+                'fetched_at': time.time()
+            }
+
+    def is_fresh(self, key: str, lastmod: Optional[str]) -> bool:
+        """Indica si el lastmod del sitemap coincide con el de la última descarga"""
+        entry = self.get(key)
+        return bool(lastmod and entry and entry.get('lastmod') == lastmod)
+
+    def reuse(self, key: str) -> Optional[dict]:
+        """Devuelve el registro cacheado sin petición HTTP (lastmod sin cambios)"""
+        with self.lock:
+            entry = self.entries[key]
+            self.lastmod_skipped += 1
+            self.bytes_saved += entry.get('size', 0)
+            record = entry.get('record')
+            return dict(record) if record else None
+
+    def revalidate(self, key: str, response, lastmod: Optional[str] = None) -> Optional[dict]:
+        """Marca una entrada como vigente (304 o hash igual) y devuelve su registro"""
+        with self.lock:
+            entry = self.entries[key]
+            if lastmod:
+                entry['lastmod'] = lastmod
+            # Un 304 puede traer validadores nuevos
+            if response.headers.get('ETag'):
+                entry['etag'] = response.headers['ETag']
+            if response.headers.get('Last-Modified'):
+                entry['last_modified'] = response.headers['Last-Modified']
+            entry['fetched_at'] = time.time()
+
+            if response.status_code == 304:
+                # Sin cuerpo: nos ahorramos la descarga completa
+                self.not_modified += 1
+                self.bytes_saved += entry.get('size', 0)
+            else:
+                # Descargado pero idéntico: nos ahorramos el parseo
+                self.unchanged += 1
+
+            record = entry.get('record')
+            return dict(record) if record else None
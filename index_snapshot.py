@@ -0,0 +1,240 @@
+"""
+Instantánea inmutable de la base de conocimiento en un único archivo.
+
+Formato (little-endian):
+    [0:8]      b'UEXSNAP1'
+    [8:16]     longitud de la cabecera JSON (uint64)
+    [16:4096]  cabecera JSON: modelo, dimensión, número de chunks y
+               (offset, bytes) de cada sección
+    [4096:]    secciones alineadas a 64 bytes: vectors (float32 n×d),
+               sq_norms (float32 n), y para ids, texts y metadata un
+               array de offsets (uint64 n+1) más los bytes UTF-8; lexical
+               (índice BM25 en JSON); sentence_offsets (uint64 n+1) y
+               sentence_vectors (float16 m×d): vectores de las frases de
+               cada chunk, en el orden de las filas
+
+Los lectores lo abren con mmap de solo lectura: varios procesos del mismo
+host comparten la caché de páginas y no copian los vectores.
+"""
+import json
+import mmap
+import os
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
+from vector_store import match_where, where_key
+
+MAGIC = b'UEXSNAP1'
+HEADER_SIZE = 4096
+ALIGNMENT = 64
+
+
+def write_snapshot(path: str, rows: Iterable[Tuple[List[str], np.ndarray, List[str], List[Dict]]],
+                   count: int, dim: int, header: Dict, lexical_state: Optional[Dict] = None,
+                   sentence_vectors: Optional[Callable[[str], Optional[np.ndarray]]] = None):
+    """Escribe la instantánea a partir de lotes (ids, embeddings, textos, metadatos);
+    sentence_vectors da los vectores de frase de cada chunk por su id"""
+    tmp_path = f"{path}.tmp"
+    ids, texts, metadatas = [], [], []
+    sentence_blocks = []
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER_SIZE)
+        vectors_offset = HEADER_SIZE
+        sq_norms = np.zeros(count, dtype=np.float32)
+        written = 0
+        # Los vectores se escriben en streaming; el texto se acumula para sus offsets
+        for batch_ids, embeddings, documents, batch_metadatas in rows:
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            if written + len(batch_ids) > count:
+                raise ValueError("Snapshot rows exceed the declared count")
+            f.write(embeddings.tobytes())
+            sq_norms[written:written + len(batch_ids)] = (embeddings ** 2).sum(axis=1)
+            written += len(batch_ids)
+            ids.extend(doc_id.encode('utf-8') for doc_id in batch_ids)
+            texts.extend(document.encode('utf-8') for document in documents)
+            metadatas.extend(json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+                             for metadata in batch_metadatas)
+            if sentence_vectors is not None:
+                for doc_id in batch_ids:
+                    vectors = sentence_vectors(doc_id)
+                    sentence_blocks.append(np.zeros((0, dim), dtype=np.float16) if vectors is None
+                                           else np.asarray(vectors, dtype=np.float16).reshape(-1, dim))
+        if written != count:
+            raise ValueError(f"Snapshot declared {count} rows but got {written}")
+
+        sections = {'vectors': [vectors_offset, count * dim * 4]}
+
+        def write_section(name: str, data: bytes):
+            padding = -f.tell() % ALIGNMENT
+            f.write(b'\0' * padding)
+            sections[name] = [f.tell(), len(data)]
+            f.write(data)
+
+        def write_strings(name: str, values: List[bytes]):
+            offsets = np.zeros(len(values) + 1, dtype=np.uint64)
+            offsets[1:] = np.cumsum([len(value) for value in values], dtype=np.uint64)
+            write_section(f"{name}_offsets", offsets.tobytes())
+            write_section(name, b''.join(values))
+
+        write_section('sq_norms', sq_norms.tobytes())
+        write_strings('ids', ids)
+        write_strings('texts', texts)
+        write_strings('metadata', metadatas)
+        if lexical_state is not None:
+            write_section('lexical', json.dumps(lexical_state, ensure_ascii=False).encode('utf-8'))
+        if sentence_vectors is not None:
+            offsets = np.zeros(count + 1, dtype=np.uint64)
+            offsets[1:] = np.cumsum([len(block) for block in sentence_blocks], dtype=np.uint64)
+            write_section('sentence_offsets', offsets.tobytes())
+            write_section('sentence_vectors', b''.join(block.tobytes() for block in sentence_blocks))
+
+        header_bytes = json.dumps(dict(header, version=1, dim=dim, count=count, sections=sections)).encode('utf-8')
+        if len(header_bytes) > HEADER_SIZE - 16:
+            raise ValueError("Snapshot header too large")
+        f.seek(0)
+        f.write(MAGIC + len(header_bytes).to_bytes(8, 'little') + header_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SnapshotStore:
+    """Almacén de solo lectura sobre una instantánea mapeada en memoria.
+
+    Implementa la parte de consulta de la interfaz de vector_store (count,
+    existing, filter_ids, get, query) con búsqueda exacta: un producto de matrices
+    sobre los vectores mapeados y argpartition para el top-k. Con un filtro
+    `where` solo se puntúan las filas que lo cumplen.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:8] != MAGIC:
+            raise ValueError(f"{path} is not a knowledge base snapshot")
+        header_length = int.from_bytes(self.buffer[8:16], 'little')
+        self.header = json.loads(self.buffer[16:16 + header_length])
+        self.dim = self.header['dim']
+        self.size = self.header['count']
+        self.vectors = self.array('vectors', np.float32).reshape(self.size, self.dim)
+        self.sq_norms = self.array('sq_norms', np.float32)
+        self.offsets = {name: self.array(f"{name}_offsets", np.uint64) for name in ('ids', 'texts', 'metadata')}
+        self.lock = threading.Lock()
+        self.row_of: Optional[Dict[str, int]] = None
+        self.metadatas: Optional[List[Dict]] = None
+        self.filter_cache: Dict[str, np.ndarray] = {}
+        self.filter_id_cache: Dict[str, Set[str]] = {}
+
+    def array(self, name: str, dtype) -> np.ndarray:
+        """Vista sin copia de una sección"""
+        offset, length = self.header['sections'][name]
+        return np.frombuffer(self.buffer, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=offset)
+
+    def string(self, name: str, row: int) -> str:
+        base = self.header['sections'][name][0]
+        offsets = self.offsets[name]
+        return self.buffer[base + int(offsets[row]):base + int(offsets[row + 1])].decode('utf-8')
+
+    def row(self, row: int) -> Dict:
+        return {'id': self.string('ids', row), 'content': self.string('texts', row),
+                'metadata': json.loads(self.string('metadata', row))}
+
+    def sentence_vectors(self, doc_id: str) -> Optional[np.ndarray]:
+        """Vectores de las frases de un chunk (vista sin copia; None si no está o la
+        instantánea no los incluye)"""
+        sections = self.header['sections']
+        row = self.row_index().get(doc_id)
+        if row is None or 'sentence_vectors' not in sections:
+            return None
+        offsets = self.array('sentence_offsets', np.uint64)
+        vectors = self.array('sentence_vectors', np.float16).reshape(-1, self.dim)
+        return vectors[int(offsets[row]):int(offsets[row + 1])]
+
+    def lexical_state(self) -> Optional[Dict]:
+        if 'lexical' not in self.header['sections']:
+            return None
+        offset, length = self.header['sections']['lexical']
+        return json.loads(self.buffer[offset:offset + length])
+
+    def row_index(self) -> Dict[str, int]:
+        """id -> fila (se construye la primera vez que se necesita)"""
+        with self.lock:
+            if self.row_of is None:
+                self.row_of = {self.string('ids', row): row for row in range(self.size)}
+            return self.row_of
+
+    def matching_rows(self, where: Dict) -> np.ndarray:
+        """Filas que cumplen el filtro (los metadatos se decodifican una sola vez)"""
+        key = where_key(where)
+        with self.lock:
+            rows = self.filter_cache.get(key)
+            if rows is None:
+                if self.metadatas is None:
+                    self.metadatas = [json.loads(self.string('metadata', row)) for row in range(self.size)]
+                rows = np.array([row for row, metadata in enumerate(self.metadatas)
+                                 if match_where(metadata, where)], dtype=np.int64)
+                if len(self.filter_cache) >= 64:
+                    self.filter_cache.clear()
+                self.filter_cache[key] = rows
+            return rows
+
+    def filter_ids(self, where: Dict) -> Set[str]:
+        """IDs de los chunks que cumplen el filtro (siempre el mismo conjunto)"""
+        key = where_key(where)
+        ids = self.filter_id_cache.get(key)
+        if ids is None:
+            ids = {self.string('ids', int(row)) for row in self.matching_rows(where)}
+            with self.lock:
+                if len(self.filter_id_cache) >= 64:
+                    self.filter_id_cache.clear()
+                self.filter_id_cache[key] = ids
+        return ids
+
+    def count(self) -> int:
+        return self.size
+
+    def existing(self, ids: List[str]) -> Set[str]:
+        row_of = self.row_index()
+        return {doc_id for doc_id in ids if doc_id in row_of}
+
+    def get(self, ids: List[str]) -> List[Dict]:
+        row_of = self.row_index()
+        return [self.row(row_of[doc_id]) for doc_id in ids if doc_id in row_of]
+
+    def iter_rows(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict]]]:
+        for start in range(0, self.size, batch_size):
+            rows = [self.row(row) for row in range(start, min(start + batch_size, self.size))]
+            yield ([row['id'] for row in rows], np.asarray(self.vectors[start:start + len(rows)]),
+                   [row['content'] for row in rows], [row['metadata'] for row in rows])
+
+    def query(self, embeddings: np.ndarray, n_results: int, where: Optional[Dict] = None) -> List[List[Dict]]:
+        """Distancia L2 al cuadrado exacta: |v|² - 2·v·q + |q|²"""
+        rows = self.matching_rows(where) if where else None
+        size = self.size if rows is None else len(rows)
+        if not size:
+            return [[] for _ in range(len(embeddings))]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if rows is None:
+            distances = self.sq_norms[None, :] - 2.0 * (embeddings @ self.vectors.T)
+        else:
+            distances = self.sq_norms[rows][None, :] - 2.0 * (embeddings @ self.vectors[rows].T)
+        distances += (embeddings ** 2).sum(axis=1)[:, None]
+        k = min(n_results, size)
+
+        results = []
+        for row_distances in distances:
+            top = np.argpartition(row_distances, k - 1)[:k]
+            top = top[np.argsort(row_distances[top])]
+            rows_found = top if rows is None else rows[top]
+            results.append([dict(self.row(int(row)), score=float(max(distance, 0.0)))
+                            for row, distance in zip(rows_found, row_distances[top])])
+        return results
+
+    def read_only(self, *args, **kwargs):
+        raise RuntimeError(f"Snapshot {self.path} is read-only; rebuild the index and export a new snapshot")
+
+    add = update_metadata = delete = reset = read_only
+
+    def save(self):
+        """Nada que guardar: la instantánea es inmutable"""
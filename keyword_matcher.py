@@ -0,0 +1,83 @@
+"""
+Búsqueda de vocabularios (palabras clave del dominio, patrones de pregunta y
+palabras de cada tipo de frase) en una sola pasada por el texto.
+
+Cada vocabulario se compila una vez en una expresión regular con forma de
+trie ("matr(?:icula|icular)|..."): en cada posición el motor sigue un único
+camino de caracteres, así el coste depende de la longitud del texto y no del
+número de patrones. Texto y patrones se comparan sin mayúsculas ni acentos.
+"""
+import re
+from typing import Dict, Iterable, Optional, Set
+
+# Minúsculas sin acentos con str.translate (mucho más rápido que NFKD por carácter)
+FOLD_TABLE = str.maketrans('áéíóúàèìòùâêîôûäëïöüñç', 'aeiouaeiouaeiouaeiounc')
+
+
+def fold(text: str) -> str:
+    return text.lower().translate(FOLD_TABLE)
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """Alternativa regex de las palabras agrupada por prefijos (prefiere la más larga)"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        group = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Una palabra termina aquí pero otras siguen: continuación opcional y voraz
+        return f"(?:{group})?" if '' in node else group
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Vocabularios con nombre (categoría -> patrones) compilados en una regex.
+
+    categories() devuelve todas las categorías presentes en el texto con un
+    único recorrido: en cada posición se toma el patrón más largo y este
+    arrastra las categorías de los patrones que son prefijo suyo, así no se
+    pierde ninguna coincidencia solapada ("donde" dentro de "donde esta").
+    """
+
+    def __init__(self, vocabularies: Dict[str, Iterable[str]]):
+        categories_of: Dict[str, Set[str]] = {}
+        for category, patterns in vocabularies.items():
+            for pattern in patterns:
+                folded = fold(pattern.strip())
+                if folded:
+                    categories_of.setdefault(folded, set()).add(category)
+        self.categories_of = {
+            pattern: set().union(*(categories for prefix, categories in categories_of.items()
+                                   if pattern.startswith(prefix)))
+            for pattern in categories_of
+        }
+        self.pattern: Optional[re.Pattern] = None
+        self.overlapping: Optional[re.Pattern] = None
+        if categories_of:
+            alternation = trie_pattern(categories_of)
+            self.pattern = re.compile(alternation)
+            # Búsqueda anticipada: prueba en todas las posiciones aunque se solapen
+            self.overlapping = re.compile(f"(?=({alternation}))")
+
+    def search(self, text: str, folded: bool = False) -> bool:
+        """¿Aparece algún patrón? (se detiene en la primera coincidencia)"""
+        if self.pattern is None:
+            return False
+        return self.pattern.search(text if folded else fold(text)) is not None
+
+    def categories(self, text: str, folded: bool = False) -> Set[str]:
+        """Todas las categorías con algún patrón en el texto"""
+        hits: Set[str] = set()
+        if self.overlapping is None:
+            return hits
+        for match in self.overlapping.finditer(text if folded else fold(text)):
+            hits |= self.categories_of[match.group(1)]
+        return hits
@@ -1,23 +1,318 @@
+import hashlib
+import heapq
 import json
 import os
-from typing import List, Dict
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import List, Dict, Iterable, Optional
+from urllib.parse import urlparse
+import numpy as np
 import logging
+from corpus_store import iter_corpus
+from dedup import CorpusDeduplicator
+from embedding_cache import EmbeddingCache
+from vector_store import create_store
+from lexical_index import LexicalIndex
+from sentence_vectors import SentenceVectorStore
+from index_snapshot import SnapshotStore, write_snapshot
+
+EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+# Versión de los campos de metadatos de los chunks: al cambiarla se reescriben
+# los metadatos de todas las páginas (sin volver a codificar)
+METADATA_VERSION = 5
+
+WHITESPACE = re.compile(r'\s+')
+CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f-\x9f]')
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def chunk_id(url: str, chunk: str) -> str:
+    """ID estable de un chunk: hash de la URL + hash de su contenido"""
+    return f"{text_hash(url)[:12]}_{text_hash(chunk)[:16]}"
+
+
+def file_fingerprint(path: str, block_size: int = 1 << 20) -> str:
+    """Hash del contenido de un archivo, leído por bloques"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def split_sentences(text: str) -> List[str]:
+    """Frases limpias de un texto: espacios colapsados, sin caracteres de control,
+    sin fragmentos de 15 caracteres o menos ni URLs"""
+    text = CONTROL_CHARS.sub('', WHITESPACE.sub(' ', text))
+    sentences = []
+    for sentence in text.split('.'):
+        sentence = sentence.strip()
+        if len(sentence) > 15 and not sentence.startswith(('http', 'www')):
+            sentences.append(sentence)
+    return sentences
+
 
 class KnowledgeBase:
-    def __init__(self, db_path: str = "./chroma_db"):
+    def __init__(self, db_path: str = "./chroma_db", model_name: str = EMBEDDING_MODEL,
+                 embedding_batch_size: int = 64, normalize_embeddings: bool = True,
+                 encode_processes: int = 1, embedding_cache_path: Optional[str] = "./embedding_cache",
+                 embedding_cache_size: int = 200000,
+                 vector_backend: Optional[str] = None, vector_quantization: Optional[str] = None,
+                 snapshot_path: Optional[str] = None):
         self.db_path = db_path
-        self.client = chromadb.PersistentClient(path=db_path)
-        self.collection = self.client.get_or_create_collection(
-            name="unex_content",
-            metadata={"description": "Universidad de Extremadura content"}
-        )
-        self.encoder = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        # Con una instantánea (o KB_SNAPSHOT) la base de conocimiento es de solo lectura
+        self.snapshot_path = snapshot_path or os.getenv('KB_SNAPSHOT') or None
+        self.read_only = self.snapshot_path is not None
+        # Por defecto el de la variable de entorno VECTOR_BACKEND (leída al crear la instancia)
+        self.vector_backend = vector_backend or os.getenv('VECTOR_BACKEND', 'chroma')
+        # none, fp16 o int8 (solo FAISS): vectores comprimidos + reordenación exacta
+        self.vector_quantization = vector_quantization or os.getenv('VECTOR_QUANTIZATION', 'none')
+        self.model_name = model_name
+        self.embedding_batch_size = embedding_batch_size
+        self.normalize_embeddings = normalize_embeddings
+        # Procesos para codificar al indexar: 1 = en este proceso, 0 = todos los núcleos
+        self.encode_processes = encode_processes
+        self.encode_pool = None
         
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        
+        # Caché de embeddings de chunks que sobrevive a reconstrucciones del índice
+        # (se abre al codificar el primer chunk)
+        self.embedding_cache_path = embedding_cache_path
+        self.embedding_cache_size = embedding_cache_size
+        self.embedding_cache = None
+        self.cache_namespace = f"{model_name}|{'normalized' if normalize_embeddings else 'raw'}"
+        self.index_stats = {}
+        
+        # El modelo (torch), el almacén vectorial y los índices se importan y abren
+        # la primera vez que se usan: crear la instancia es inmediato (ver warm_up)
+        self.load_lock = threading.RLock()
+        self._encoder = None
+        self._store = None
+        self._lexical_index = None
+        self._sentence_vectors = None
+        self._manifest = None
+    
+    @property
+    def encoder(self):
+        """Modelo de embeddings (SentenceTransformer), cargado en el primer uso"""
+        if self._encoder is None:
+            if self.read_only:
+                # La instantánea fija el modelo y la normalización
+                self.open_index()
+            with self.load_lock:
+                if self._encoder is None:
+                    start = time.perf_counter()
+                    from sentence_transformers import SentenceTransformer
+                    self._encoder = SentenceTransformer(self.model_name)
+                    self.logger.info(f"Loaded embedding model {self.model_name} in {time.perf_counter() - start:.1f}s")
+        return self._encoder
+    
+    @property
+    def store(self):
+        if self._store is None:
+            self.open_index()
+        return self._store
+    
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        if self._lexical_index is None:
+            self.open_index()
+        return self._lexical_index
+    
+    @property
+    def sentence_vectors(self) -> SentenceVectorStore:
+        if self._sentence_vectors is None:
+            self.open_index()
+        return self._sentence_vectors
+    
+    @property
+    def manifest(self) -> Dict:
+        if self._manifest is None:
+            self.open_index()
+        return self._manifest
+    
+    def embedding_dimension(self) -> int:
+        return self.encoder.get_sentence_embedding_dimension()
+    
+    def open_index(self):
+        """Abre el almacén vectorial, el manifiesto y el índice BM25 (solo la primera vez)"""
+        with self.load_lock:
+            if self._store is not None:
+                return
+            if self.read_only:
+                self.open_snapshot()
+                return
+            # Chroma, FAISS plano, FAISS HNSW o FAISS IVF; el manifiesto va con cada backend.
+            # Chroma no necesita la dimensión, así que no obliga a cargar el modelo
+            dim = None if self.vector_backend == 'chroma' else self.embedding_dimension()
+            store = create_store(self.vector_backend, self.db_path, dim, self.model_name, self.vector_quantization)
+            self.manifest_path = os.path.join(store.path, "index_manifest.json")
+            self.version_path = os.path.join(store.path, "index_version")
+            self._manifest = self.load_manifest()
+            # Índice BM25 sobre los mismos chunks, para search(mode="hybrid")
+            self._lexical_index = LexicalIndex(os.path.join(store.path, "lexical_index.json"))
+            # Embeddings de las frases de cada chunk, para el chatbot
+            self._sentence_vectors = SentenceVectorStore(store.path)
+            indexed_model = self._manifest.get('model')
+            if indexed_model != self.model_name and store.count() > 0:
+                self.logger.warning(
+                    f"Index was built with {indexed_model or 'Chroma default embeddings'}, "
+                    f"queries use {self.model_name}; re-run knowledge_base.py to re-index"
+                )
+            self._store = store
+    
+    def open_snapshot(self):
+        """Abre la instantánea sin copiarla: vectores, textos y metadatos quedan mapeados"""
+        start = time.perf_counter()
+        store = SnapshotStore(self.snapshot_path)
+        snapshot_model = store.header.get('model')
+        if snapshot_model and snapshot_model != self.model_name:
+            self.logger.warning(f"Snapshot was built with {snapshot_model}; using it for queries")
+            self.model_name = snapshot_model
+        self.normalize_embeddings = store.header.get('normalized', self.normalize_embeddings)
+        self._lexical_index = LexicalIndex(None)
+        lexical_state = store.lexical_state()
+        if lexical_state:
+            self._lexical_index.set_state(lexical_state)
+        # Los vectores de frase los sirve la propia instantánea (sentence_embeddings)
+        self._sentence_vectors = SentenceVectorStore(None)
+        self._manifest = {'model': self.model_name, 'pages': {}}
+        self._store = store
+        self.logger.info(
+            f"Opened read-only snapshot {self.snapshot_path} with {store.count()} chunks "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+    
+    def index_version(self) -> str:
+        """Versión del índice: cambia cada vez que add_documents añade, modifica o borra
+        chunks, también si lo hace otro proceso sobre el mismo almacén (para invalidar cachés)"""
+        if self.read_only:
+            return self.store.header.get('index_version') or f"snapshot-{os.path.getmtime(self.snapshot_path)}"
+        self.open_index()
+        try:
+            with open(self.version_path, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return 'unversioned'
+    
+    def bump_index_version(self):
+        os.makedirs(self.store.path, exist_ok=True)
+        tmp_path = f"{self.version_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.version_path)
+    
+    def warm_up(self) -> float:
+        """Carga ya lo que la primera consulta cargaría de forma perezosa (índice,
+        modelo y una codificación de prueba); devuelve los segundos empleados"""
+        start = time.perf_counter()
+        self.open_index()
+        self.embed(["Universidad de Extremadura"])
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"Knowledge base warmed up in {elapsed:.1f}s")
+        return elapsed
+    
+    def export_snapshot(self, path: str):
+        """Escribe la base de conocimiento en una instantánea inmutable (ver index_snapshot)"""
+        start = time.perf_counter()
+        write_snapshot(
+            path,
+            self.store.iter_rows(),
+            count=self.store.count(),
+            dim=self.embedding_dimension(),
+            header={'model': self.model_name, 'normalized': self.normalize_embeddings,
+                    'index_version': self.index_version()},
+            lexical_state=self.lexical_index.state(),
+            sentence_vectors=self.sentence_embeddings
+        )
+        self.logger.info(
+            f"Exported {self.store.count()} chunks to snapshot {path} "
+            f"({os.path.getsize(path) / 1024 / 1024:.1f} MB) in {time.perf_counter() - start:.1f}s"
+        )
+    
+    def start_encode_pool(self):
+        """Arranca el pool multiproceso de codificación (si está configurado)"""
+        if self.encode_pool is None and self.encode_processes != 1:
+            processes = self.encode_processes or os.cpu_count() or 1
+            self.encode_pool = self.encoder.start_multi_process_pool(target_devices=['cpu'] * processes)
+            self.logger.info(f"Started encode pool with {processes} processes")
+    
+    def stop_encode_pool(self):
+        if self.encode_pool is not None:
+            self.encoder.stop_multi_process_pool(self.encode_pool)
+            self.encode_pool = None
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Codifica textos por lotes con el modelo de la base de conocimiento"""
+        if self.encode_pool is not None:
+            embeddings = self.encoder.encode_multi_process(
+                texts, self.encode_pool,
+                batch_size=self.embedding_batch_size,
+                normalize_embeddings=self.normalize_embeddings
+            )
+        else:
+            embeddings = self.encoder.encode(
+                texts,
+                batch_size=self.embedding_batch_size,
+                normalize_embeddings=self.normalize_embeddings,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    def embed_chunks(self, texts: List[str]) -> np.ndarray:
+        """Como embed, pero reutilizando la caché persistente: solo se codifican los fallos"""
+        if self.embedding_cache is None and self.embedding_cache_path:
+            self.embedding_cache = EmbeddingCache(
+                self.embedding_cache_path,
+                dim=self.embedding_dimension(),
+                max_entries=self.embedding_cache_size
+            )
+        if self.embedding_cache is None:
+            return self.embed(texts)
+        keys = [EmbeddingCache.key(self.cache_namespace, text) for text in texts]
+        vectors, missing = self.embedding_cache.lookup(keys)
+        if missing:
+            # Los textos repetidos en el lote se codifican una sola vez
+            positions: Dict[str, List[int]] = {}
+            for k in missing:
+                positions.setdefault(keys[k], []).append(k)
+            first = [group[0] for group in positions.values()]
+            encoded = self.embed([texts[k] for k in first])
+            for vector, group in zip(encoded, positions.values()):
+                vectors[group] = vector
+            self.embedding_cache.store(list(positions), encoded)
+        return vectors
+    
+    def embed_sentences(self, ids: List[str], metadatas: List[Dict]) -> int:
+        """Codifica en un lote las frases de los chunks que aún no tienen vectores de frase
+        (en el orden de su tabla `sentences`); devuelve cuántas frases se han codificado"""
+        todo = [(doc_id, metadata['sentences'].split('\n') if metadata['sentences'] else [])
+                for doc_id, metadata in zip(ids, metadatas) if doc_id not in self.sentence_vectors]
+        sentences = [sentence for _, table in todo for sentence in table]
+        if not todo:
+            return 0
+        # Las frases pasan por la caché de embeddings como los chunks
+        vectors = self.embed_chunks(sentences) if sentences else np.zeros((0, self.embedding_dimension()))
+        start = 0
+        for doc_id, table in todo:
+            self.sentence_vectors.put(doc_id, vectors[start:start + len(table)])
+            start += len(table)
+        return len(sentences)
+    
+    def sentence_embeddings(self, doc_id: str) -> Optional[np.ndarray]:
+        """Vectores de las frases de un chunk, en el orden de `sentences` (None si no los hay)"""
+        if self.read_only:
+            return self.store.sentence_vectors(doc_id)
+        return self.sentence_vectors.get(doc_id)
     
     def chunk_text(self, text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
         """Divide el texto en chunks más pequeños para mejor recuperación"""
@@ -48,90 +343,309 @@ class KnowledgeBase:
         
         return chunks
     
-    def add_documents(self, content_data: List[Dict]):
-        """Añade documentos a la base de conocimiento"""
+    def load_manifest(self) -> Dict:
+        """Manifiesto del índice: modelo y, por URL, hash de la página e IDs de sus chunks"""
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Unreadable manifest {self.manifest_path}, rebuilding index: {str(e)}")
+        return {'model': None, 'pages': {}}
+    
+    def save_manifest(self):
+        """Guarda el manifiesto de forma atómica"""
+        os.makedirs(self.store.path, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+    
+    def reset_index(self):
+        """Vacía el almacén vectorial y el manifiesto"""
+        self.store.reset()
+        self.lexical_index.clear()
+        self.sentence_vectors.clear()
+        self._manifest = {'model': self.model_name, 'pages': {}}
+    
+    def index_is_current(self) -> bool:
+        """¿Refleja el índice el último add_documents sin nada pendiente de reconstruir?"""
+        return (self.manifest.get('model') == self.model_name
+                and self.manifest.get('metadata_version') == METADATA_VERSION
+                and self.lexical_index.count() == self.store.count()
+                and self.sentence_vectors.count() == self.store.count())
+    
+    def add_documents(self, content_data: Iterable[Dict], batch_size: int = 256,
+                      remove_missing: bool = False):
+        """Añade o actualiza documentos en la base de conocimiento.
+        
+        Acepta cualquier iterable (p. ej. el generador de iter_corpus). Los IDs de
+        los chunks dependen de la URL y del contenido, así que solo se codifican
+        los chunks nuevos o modificados; las páginas sin cambios se saltan. Con
+        remove_missing=True se borran los chunks de las páginas que ya no están.
+        """
+        if self.read_only:
+            raise RuntimeError("Knowledge base opened from a read-only snapshot")
+        if self.manifest.get('model') != self.model_name or (
+                not self.manifest['pages'] and self.store.count() > 0):
+            self.logger.info("Index has no manifest for this model; rebuilding it")
+            self.reset_index()
+        pages = self.manifest['pages']
+        # El índice deja de corresponder solo al último corpus cargado (load_from_json lo vuelve a fijar)
+        self.manifest.pop('corpus', None)
+        # Índice léxico o vectores de frase incompletos (p. ej. creados antes que
+        # ellos) o metadatos de otra versión: se reprocesan todas las páginas; los
+        # chunks ya codificados no se vuelven a codificar
+        rebuild_indexes = (self.lexical_index.count() != self.store.count()
+                           or self.sentence_vectors.count() != self.store.count())
+        refresh_metadata = self.manifest.get('metadata_version') != METADATA_VERSION
+        
         documents = []
         metadatas = []
         ids = []
+        stale_ids = []
+        seen_urls = set()
+        stats = {
+            'pages_new': 0, 'pages_changed': 0, 'pages_unchanged': 0, 'pages_removed': 0,
+            'chunks_embedded': 0, 'chunks_reused': 0, 'chunks_deleted': 0, 'sentences_embedded': 0
+        }
+        embed_seconds = 0.0
+        start = time.perf_counter()
         
-        for i, item in enumerate(content_data):
-            if not item.get('content'):
-                continue
+        def flush():
+            nonlocal embed_seconds
+            # Los chunks que ya están en la colección no se vuelven a codificar
+            existing = self.store.existing(ids)
+            new = [k for k, doc_id in enumerate(ids) if doc_id not in existing]
+            embed_start = time.perf_counter()
+            # Embeddings de frase para el chatbot (solo los chunks que no los tienen)
+            stats['sentences_embedded'] += self.embed_sentences(ids, metadatas)
+            embed_seconds += time.perf_counter() - embed_start
+            if new:
+                embed_start = time.perf_counter()
+                embeddings = self.embed_chunks([documents[k] for k in new])
+                embed_seconds += time.perf_counter() - embed_start
+                self.store.add(ids=[ids[k] for k in new], embeddings=embeddings,
+                               documents=[documents[k] for k in new],
+                               metadatas=[metadatas[k] for k in new])
+            if existing:
+                kept = [k for k, doc_id in enumerate(ids) if doc_id in existing]
+                self.store.update_metadata(ids=[ids[k] for k in kept],
+                                           metadatas=[metadatas[k] for k in kept])
+            for doc_id, document in zip(ids, documents):
+                self.lexical_index.add(doc_id, document)
+            stats['chunks_embedded'] += len(new)
+            stats['chunks_reused'] += len(ids) - len(new)
+        
+        self.start_encode_pool()
+        try:
+            for item in content_data:
+                if not item.get('content'):
+                    continue
+                url = item['url']
+                if url in seen_urls:
+                    continue
+                seen_urls.add(url)
                 
-            # Crear chunks del contenido
-            chunks = self.chunk_text(item['content'])
-            
-            for j, chunk in enumerate(chunks):
-                doc_id = f"doc_{i}_{j}"
-                documents.append(chunk)
-                metadatas.append({
-                    'url': item['url'],
-                    'title': item['title'],
-                    'chunk_index': j,
-                    'total_chunks': len(chunks)
-                })
-                ids.append(doc_id)
-        
-        self.logger.info(f"Adding {len(documents)} chunks to knowledge base")
-        
-        # Añadir en lotes para evitar problemas de memoria
-        batch_size = 100
-        for i in range(0, len(documents), batch_size):
-            batch_docs = documents[i:i+batch_size]
-            batch_metadata = metadatas[i:i+batch_size]
-            batch_ids = ids[i:i+batch_size]
+                page_hash = text_hash(f"{item.get('title', '')}\n{item['content']}")
+                previous = pages.get(url)
+                if previous and previous['hash'] == page_hash and not (rebuild_indexes or refresh_metadata):
+                    stats['pages_unchanged'] += 1
+                    continue
+                
+                # Crear chunks del contenido
+                chunks = self.chunk_text(item['content'])
+                page_ids = []
+                for j, chunk in enumerate(chunks):
+                    doc_id = chunk_id(url, chunk)
+                    if doc_id in page_ids:
+                        continue
+                    page_ids.append(doc_id)
+                    documents.append(chunk)
+                    # Campos del scraper para filtrar en search(where=...); scraped_at
+                    # es el momento en que se obtuvo el contenido indexado
+                    metadatas.append({
+                        'url': url,
+                        'title': item['title'],
+                        'chunk_index': j,
+                        'total_chunks': len(chunks),
+                        'content_type': item.get('content_type') or 'html',
+                        'host': urlparse(url).netloc.lower(),
+                        'scraped_at': float(item.get('scraped_at') or 0.0),
+                        'word_count': int(item.get('word_count') or len(item['content'].split())),
+                        # Tabla de frases limpias (una por línea): el chatbot no tiene
+                        # que limpiar ni trocear el texto en cada pregunta
+                        'sentences': '\n'.join(split_sentences(chunk))
+                    })
+                    ids.append(doc_id)
+                
+                if previous:
+                    stale_ids.extend(set(previous['chunk_ids']) - set(page_ids))
+                    stats['pages_changed'] += 1
+                else:
+                    stats['pages_new'] += 1
+                pages[url] = {'hash': page_hash, 'chunk_ids': page_ids}
+                
+                # Añadir en lotes para evitar problemas de memoria
+                if len(documents) >= batch_size:
+                    flush()
+                    documents, metadatas, ids = [], [], []
             
-            self.collection.add(
-                documents=batch_docs,
-                metadatas=batch_metadata,
-                ids=batch_ids
+            if documents:
+                flush()
+        finally:
+            self.stop_encode_pool()
+        
+        if remove_missing:
+            for url in [url for url in pages if url not in seen_urls]:
+                stale_ids.extend(pages.pop(url)['chunk_ids'])
+                stats['pages_removed'] += 1
+        for i in range(0, len(stale_ids), batch_size):
+            self.store.delete(ids=stale_ids[i:i + batch_size])
+        for doc_id in stale_ids:
+            self.lexical_index.remove(doc_id)
+            self.sentence_vectors.remove(doc_id)
+        stats['chunks_deleted'] = len(stale_ids)
+        self.manifest['metadata_version'] = METADATA_VERSION
+        self.store.save()
+        self.save_manifest()
+        self.lexical_index.save()
+        self.sentence_vectors.save()
+        if any(stats[key] for key in ('pages_new', 'pages_changed', 'pages_removed',
+                                      'chunks_embedded', 'chunks_deleted')):
+            self.bump_index_version()
+        if self.embedding_cache is not None:
+            self.embedding_cache.save()
+            stats.update({f"cache_{key}": value for key, value in self.embedding_cache.stats().items()})
+        
+        elapsed = time.perf_counter() - start
+        self.index_stats = dict(
+            stats,
+            seconds=round(elapsed, 2),
+            embed_seconds=round(embed_seconds, 2),
+            chunks_per_sec=round(stats['chunks_embedded'] / embed_seconds, 1) if embed_seconds > 0 else 0.0
+        )
+        self.logger.info(
+            f"Indexed in {elapsed:.1f}s: {stats['pages_new']} new, {stats['pages_changed']} changed, "
+            f"{stats['pages_unchanged']} unchanged, {stats['pages_removed']} removed pages; "
+            f"{stats['chunks_embedded']} chunks embedded ({self.index_stats['chunks_per_sec']} chunks/s), "
+            f"{stats['chunks_reused']} reused, {stats['chunks_deleted']} deleted; "
+            f"{stats['sentences_embedded']} sentence embeddings"
+        )
+        if self.embedding_cache is not None:
+            self.logger.info(
+                f"Embedding cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses, "
+                f"{stats['cache_evictions']} evictions, {stats['cache_entries']} entries"
             )
+        return stats['chunks_embedded']
+    
+    def search(self, query: str, n_results: int = 5, mode: str = "vector",
+               where: Optional[Dict] = None, query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
+        """Busca contenido relevante basado en la consulta.
         
-        self.logger.info("Documents added successfully")
+        mode: "vector" (embeddings), "lexical" (BM25) o "hybrid" (ambas listas
+        fusionadas con reciprocal-rank fusion). En "vector" score es la distancia;
+        en los otros modos los resultados llevan además bm25_score y fusion_score,
+        y score es None para los chunks que solo encontró BM25.
+        
+        where filtra por metadatos dentro del almacén, antes de puntuar (sintaxis
+        de Chroma, ver vector_store): {'host': 'alumnado.unex.es'},
+        {'content_type': 'pdf'}, {'scraped_at': {'$gte': timestamp}}...
+        
+        query_embedding evita volver a codificar una consulta ya codificada con embed().
+        """
+        query_embeddings = None if query_embedding is None else np.asarray(query_embedding)[None, :]
+        return self.search_many([query], n_results, mode, where, query_embeddings)[0]
     
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
-        """Busca contenido relevante basado en la consulta"""
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
+    def search_many(self, queries: List[str], n_results: int = 5, mode: str = "vector",
+                    where: Optional[Dict] = None, query_embeddings: Optional[np.ndarray] = None) -> List[List[Dict]]:
+        """Como search para varias consultas: una sola pasada del modelo para todas
+        y una sola búsqueda vectorial; devuelve una lista de resultados por consulta"""
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"Unknown search mode: {mode}")
+        if not queries:
+            return []
+        if query_embeddings is None and mode != "lexical":
+            query_embeddings = self.embed(queries)
+        if mode == "vector":
+            return self.store.query(query_embeddings, n_results, where=where)
         
-        formatted_results = []
-        if results['documents'] and results['documents'][0]:
-            for i, doc in enumerate(results['documents'][0]):
-                formatted_results.append({
-                    'content': doc,
-                    'metadata': results['metadatas'][0][i],
-                    'score': results['distances'][0][i] if results['distances'] else None
-                })
+        candidates = max(n_results * 4, 20)
+        allowed = self.store.filter_ids(where) if where else None
+        lexical_hits = [self.lexical_index.search(query, n_results if mode == "lexical" else candidates, allowed)
+                        for query in queries]
+        vector_results = [[] for _ in queries]
+        if mode == "hybrid":
+            vector_results = self.store.query(query_embeddings, candidates, where=where)
+        return [self.fuse_results(vector, lexical, n_results)
+                for vector, lexical in zip(vector_results, lexical_hits)]
+    
+    def fuse_results(self, vector_results: List[Dict], lexical_hits: List, n_results: int,
+                     rrf_k: int = 60) -> List[Dict]:
+        """Reciprocal-rank fusion: cada lista aporta 1 / (rrf_k + posición)"""
+        fused = {}
+        for rank, result in enumerate(vector_results, 1):
+            fused[result['id']] = 1.0 / (rrf_k + rank)
+        for rank, (doc_id, _) in enumerate(lexical_hits, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+        top = heapq.nlargest(n_results, fused.items(), key=lambda item: item[1])
         
-        return formatted_results
+        by_id = {result['id']: result for result in vector_results}
+        # Texto y metadatos de los chunks que solo ha encontrado BM25
+        missing = [doc_id for doc_id, _ in top if doc_id not in by_id]
+        if missing:
+            for result in self.store.get(missing):
+                by_id[result['id']] = dict(result, score=None)
+        bm25_scores = dict(lexical_hits)
+        return [
+            dict(by_id[doc_id], fusion_score=score, bm25_score=bm25_scores.get(doc_id))
+            for doc_id, score in top if doc_id in by_id
+        ]
     
-    def load_from_json(self, json_file: str):
-        """Carga datos desde un archivo JSON y los añade a la base de conocimiento"""
+    def load_from_json(self, json_file: str, deduplicate: bool = True):
+        """Carga datos desde el corpus (JSONL o JSON) y los añade a la base de conocimiento"""
+        if self.read_only:
+            self.logger.info(f"Serving read-only snapshot {self.snapshot_path}; skipping {json_file}")
+            return
         if not os.path.exists(json_file):
             self.logger.error(f"File {json_file} not found")
             return
         
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Mismo archivo, mismas opciones e índice al día: no hace falta deduplicar ni releerlo
+        corpus = {'fingerprint': file_fingerprint(json_file), 'deduplicate': deduplicate}
+        if self.manifest.get('corpus') == corpus and self.index_is_current():
+            self.logger.info(f"Corpus {json_file} unchanged since last load; index is up to date")
+            return
         
-        # Verificar si el archivo tiene el formato nuevo con metadatos
-        if isinstance(data, dict) and 'content' in data:
-            content_data = data['content']
-            self.logger.info(f"Loading enhanced data format with {data.get('scraping_stats', {}).get('total_pages', len(content_data))} pages")
+        # El corpus se consume como generador: no se carga entero en memoria
+        self.logger.info(f"Loading corpus from {json_file}")
+        if deduplicate:
+            # Quitar duplicados y boilerplate repetido antes de trocear e indexar
+            records = CorpusDeduplicator().filter(lambda: iter_corpus(json_file))
         else:
-            # Formato antiguo
-            content_data = data
+            records = iter_corpus(json_file)
         
-        self.add_documents(content_data)
+        # El corpus es completo: las páginas que ya no aparecen se borran del índice
+        self.add_documents(records, remove_missing=True)
+        self.manifest['corpus'] = corpus
+        self.save_manifest()
         self.logger.info(f"Knowledge base updated with data from {json_file}")
 
 if __name__ == "__main__":
-    kb = KnowledgeBase()
+    # --multi-process reparte la codificación entre todos los núcleos;
+    # --backend chroma|faiss-flat|faiss-hnsw|faiss-ivf elige el almacén vectorial
+    # --quantization none|fp16|int8 comprime los vectores del índice FAISS
+    # --export-snapshot RUTA escribe además una instantánea de solo lectura (KB_SNAPSHOT)
+    backend_args = {}
+    if '--backend' in sys.argv:
+        backend_args['vector_backend'] = sys.argv[sys.argv.index('--backend') + 1]
+    if '--quantization' in sys.argv:
+        backend_args['vector_quantization'] = sys.argv[sys.argv.index('--quantization') + 1]
+    kb = KnowledgeBase(encode_processes=0 if '--multi-process' in sys.argv else 1, **backend_args)
     
     # Buscar archivos de datos disponibles
     files_to_try = [
+        "unex_content.jsonl",
         "unex_content_enhanced.json",
         "unex_content.json"
     ]
@@ -140,10 +654,14 @@ if __name__ == "__main__":
     for json_file in files_to_try:
         if os.path.exists(json_file):
             print(f"Encontrado archivo: {json_file}")
-            kb.load_from_json(json_file)
+            # --no-dedup indexa el corpus tal cual (para comparar el número de chunks)
+            kb.load_from_json(json_file, deduplicate='--no-dedup' not in sys.argv)
             file_found = True
             break
     
+    if file_found and '--export-snapshot' in sys.argv:
+        kb.export_snapshot(sys.argv[sys.argv.index('--export-snapshot') + 1])
+    
     if not file_found:
         print("No se encontró ningún archivo de datos. Ejecuta primero web_scraper.py o web_scraper_new.py")
     else:
@@ -0,0 +1,206 @@
+"""
+Índice invertido BM25 sobre los chunks de la base de conocimiento.
+
+Se construye al indexar (no al consultar) con una tokenización para español
+sin acentos ni mayúsculas, sin palabras vacías y con un plural simplificado,
+para que términos exactos como "automatrícula", "TFG" o "SIAA" se encuentren
+aunque la búsqueda densa no los priorice.
+
+Para consultar, cada término se convierte la primera vez en dos arrays
+(posiciones de sus chunks y su aportación BM25 ya ponderada por idf) que se
+reutilizan hasta que el índice cambia: puntuar es sumar arrays con NumPy.
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+STOPWORDS = {
+    'a', 'al', 'algo', 'como', 'con', 'cual', 'cuando', 'de', 'del', 'desde', 'donde', 'el',
+    'ella', 'en', 'entre', 'era', 'es', 'esa', 'ese', 'eso', 'esta', 'este', 'esto', 'fue',
+    'ha', 'hay', 'la', 'las', 'le', 'lo', 'los', 'mas', 'me', 'mi', 'muy', 'ni', 'no', 'o',
+    'os', 'para', 'pero', 'por', 'que', 'quien', 'se', 'ser', 'si', 'sin', 'sobre', 'son',
+    'su', 'sus', 'te', 'tu', 'u', 'un', 'una', 'uno', 'unos', 'unas', 'y', 'ya', 'yo'
+}
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin acentos (matrícula -> matricula)"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def stem(token: str) -> str:
+    """Plural simplificado: becas -> beca, universidades -> universidad"""
+    if len(token) > 4 and token.endswith('es') and token[-3] in 'dlnr':
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in TOKEN_PATTERN.findall(fold(text)) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """Índice invertido persistente con puntuación BM25"""
+
+    def __init__(self, path: Optional[str], k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        # término -> {id del chunk: frecuencia}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        # id del chunk -> longitud en tokens (para borrar y normalizar)
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_terms: Dict[str, List[str]] = {}
+        self.total_length = 0
+        # Vista NumPy para consultar (se descarta con cada cambio del índice)
+        self.doc_ids: Optional[List[str]] = None
+        self.term_weights: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # id del conjunto `allowed` -> (conjunto, máscara de chunks permitidos)
+        self.allowed_masks: Dict[int, Tuple[Set[str], np.ndarray]] = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.set_state(json.load(f))
+        except (OSError, ValueError):
+            return
+
+    def state(self) -> Dict:
+        return {'postings': self.postings, 'doc_lengths': self.doc_lengths, 'doc_terms': self.doc_terms}
+
+    def set_state(self, data: Dict):
+        self.postings = data['postings']
+        self.doc_lengths = data['doc_lengths']
+        self.doc_terms = data['doc_terms']
+        self.total_length = sum(self.doc_lengths.values())
+        self.invalidate()
+
+    def invalidate(self):
+        self.doc_ids = None
+        self.term_weights = {}
+        self.allowed_masks = {}
+
+    def save(self):
+        """Guarda el índice de forma atómica"""
+        with self.lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state(), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def count(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id: str, text: str):
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        with self.lock:
+            if doc_id in self.doc_lengths:
+                return
+            for term, frequency in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            self.doc_lengths[doc_id] = len(tokens)
+            self.doc_terms[doc_id] = list(counts)
+            self.total_length += len(tokens)
+            self.invalidate()
+
+    def remove(self, doc_id: str):
+        with self.lock:
+            if doc_id not in self.doc_lengths:
+                return
+            for term in self.doc_terms.pop(doc_id):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            self.invalidate()
+
+    def clear(self):
+        with self.lock:
+            self.postings, self.doc_lengths, self.doc_terms = {}, {}, {}
+            self.total_length = 0
+            self.invalidate()
+
+    def compile(self):
+        """Posición de cada chunk en los arrays y normalización BM25 por longitud"""
+        self.doc_ids = list(self.doc_lengths)
+        self.doc_index = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        lengths = np.fromiter(self.doc_lengths.values(), dtype=np.float64, count=len(self.doc_ids))
+        average_length = self.total_length / len(self.doc_ids) if self.total_length else 1.0
+        self.norms = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+    def term_weight(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(posiciones, aportación BM25) de los chunks que contienen el término"""
+        weight = self.term_weights.get(term)
+        if weight is None:
+            postings = self.postings.get(term)
+            if not postings:
+                return None
+            positions = np.fromiter((self.doc_index[doc_id] for doc_id in postings),
+                                    dtype=np.int64, count=len(postings))
+            frequencies = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            total_docs = len(self.doc_ids)
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            weight = (positions, idf * frequencies * (self.k1 + 1) / (frequencies + self.norms[positions]))
+            self.term_weights[term] = weight
+        return weight
+
+    def allowed_mask(self, allowed: Set[str]) -> np.ndarray:
+        """Máscara de los chunks permitidos; los almacenes devuelven el mismo conjunto
+        para el mismo filtro mientras no cambian, así se calcula una vez por filtro"""
+        entry = self.allowed_masks.get(id(allowed))
+        if entry is not None and entry[0] is allowed:
+            return entry[1]
+        mask = np.zeros(len(self.doc_ids), dtype=bool)
+        positions = [self.doc_index[doc_id] for doc_id in allowed if doc_id in self.doc_index]
+        mask[positions] = True
+        if len(self.allowed_masks) >= 64:
+            self.allowed_masks.clear()
+        self.allowed_masks[id(allowed)] = (allowed, mask)
+        return mask
+
+    def search(self, query: str, n_results: int = 10,
+               allowed: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """(id, puntuación BM25) de los mejores chunks para la consulta.
+        
+        Con allowed solo se puntúan esos chunks (los que cumplen un filtro de metadatos).
+        """
+        with self.lock:
+            if not self.doc_lengths:
+                return []
+            if self.doc_ids is None:
+                self.compile()
+            scores = np.zeros(len(self.doc_ids))
+            for term in set(tokenize(query)):
+                weight = self.term_weight(term)
+                if weight is not None:
+                    # Un término aparece una vez por chunk: no hay posiciones repetidas
+                    scores[weight[0]] += weight[1]
+            if allowed is not None:
+                scores[~self.allowed_mask(allowed)] = 0.0
+            # Las aportaciones BM25 son positivas: 0 es no coincidir con ningún término
+            matched = np.flatnonzero(scores)
+            if len(matched) > n_results:
+                matched = matched[np.argpartition(-scores[matched], n_results - 1)[:n_results]]
+            matched = matched[np.argsort(-scores[matched], kind='stable')]
+            return [(self.doc_ids[i], float(scores[i])) for i in matched]
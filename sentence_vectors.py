@@ -0,0 +1,132 @@
+"""
+Embeddings de las frases de cada chunk, fuera de los metadatos.
+
+El chatbot elige las frases clave de la respuesta por similitud con la
+pregunta; los vectores de frase se calculan al indexar y se guardan aquí,
+en una matriz float16 (`sentence_vectors.npy`, abierta mapeada en memoria)
+con un índice JSON id del chunk -> (primera fila, número de frases), en el
+orden de su tabla `sentences`. Así no pasan por los metadatos que leen los
+filtros `where` ni los almacenes vectoriales.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+
+
+class SentenceVectorStore:
+    """Vectores de frase por chunk, persistidos junto al índice"""
+
+    def __init__(self, path: Optional[str], compact_ratio: float = 0.1):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self.clear()
+        self.load()
+
+    def clear(self):
+        # id del chunk -> [primera fila, número de frases]
+        self.spans: Dict[str, List[int]] = {}
+        self.dim: Optional[int] = None
+        self.vectors = np.zeros((0, 0), dtype=np.float16)
+        self.pending: List[np.ndarray] = []
+        self.rows = 0
+        self.dead = 0
+        self.dirty = False
+
+    def load(self):
+        if not self.path:
+            return
+        spans_path = os.path.join(self.path, "sentence_vectors.json")
+        vectors_path = os.path.join(self.path, "sentence_vectors.npy")
+        if not os.path.exists(spans_path) or not os.path.exists(vectors_path):
+            return
+        try:
+            with open(spans_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            vectors = np.load(vectors_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Unreadable sentence vectors in {self.path}: {str(e)}")
+            return
+        if len(vectors) != index['rows']:
+            self.logger.warning(f"Sentence vectors in {self.path} are inconsistent; ignoring them")
+            return
+        self.spans = index['spans']
+        self.dim = index['dim']
+        self.vectors = vectors
+        self.rows = index['rows']
+        self.dead = self.rows - sum(count for _, count in self.spans.values())
+
+    def count(self) -> int:
+        return len(self.spans)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.spans
+
+    def all_vectors(self) -> np.ndarray:
+        if self.pending:
+            self.vectors = np.concatenate([self.vectors] + self.pending)
+            self.pending = []
+        return self.vectors
+
+    def put(self, doc_id: str, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float16)
+        with self.lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self.vectors = np.zeros((0, self.dim), dtype=np.float16)
+            if doc_id in self.spans:
+                self.dead += self.spans[doc_id][1]
+            self.spans[doc_id] = [self.rows, len(vectors)]
+            self.pending.append(vectors.reshape(-1, self.dim))
+            self.rows += len(vectors)
+            self.dirty = True
+
+    def remove(self, doc_id: str):
+        with self.lock:
+            span = self.spans.pop(doc_id, None)
+            if span is not None:
+                self.dead += span[1]
+                self.dirty = True
+
+    def get(self, doc_id: str) -> Optional[np.ndarray]:
+        """Vectores de las frases del chunk (None si no se calcularon)"""
+        with self.lock:
+            span = self.spans.get(doc_id)
+            if span is None:
+                return None
+            start, count = span
+            return np.asarray(self.all_vectors()[start:start + count])
+
+    def compact(self):
+        """Elimina las filas de chunks borrados o reemplazados"""
+        vectors = self.all_vectors()
+        blocks, spans, rows = [], {}, 0
+        for doc_id, (start, count) in self.spans.items():
+            blocks.append(vectors[start:start + count])
+            spans[doc_id] = [rows, count]
+            rows += count
+        self.vectors = np.concatenate(blocks) if blocks else np.zeros((0, self.dim or 0), dtype=np.float16)
+        self.spans, self.rows, self.dead = spans, rows, 0
+
+    def save(self):
+        """Guarda la matriz y el índice de forma atómica"""
+        with self.lock:
+            if not self.dirty or not self.path:
+                return
+            if self.dead > self.compact_ratio * max(self.rows, 1):
+                self.compact()
+            os.makedirs(self.path, exist_ok=True)
+            vectors_path = os.path.join(self.path, "sentence_vectors.npy")
+            spans_path = os.path.join(self.path, "sentence_vectors.json")
+            with open(f"{vectors_path}.tmp", 'wb') as f:
+                np.save(f, np.asarray(self.all_vectors(), dtype=np.float16))
+            os.replace(f"{vectors_path}.tmp", vectors_path)
+            with open(f"{spans_path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump({'dim': self.dim, 'rows': self.rows, 'spans': self.spans}, f)
+            os.replace(f"{spans_path}.tmp", spans_path)
+            self.vectors = np.load(vectors_path, mmap_mode='r')
+            self.dirty = False
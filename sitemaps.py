@@ -0,0 +1,140 @@
+"""
+Descubrimiento de URLs a partir de robots.txt y sitemap.xml de cada host.
+"""
+import gzip
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+
+def host_root(url: str) -> str:
+    """Esquema y host de una URL (p. ej. https://alumnado.unex.es)"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def local_name(tag: str) -> str:
+    """Nombre de una etiqueta XML sin el espacio de nombres"""
+    return tag.rsplit('}', 1)[-1]
+
+
+class SiteDiscovery:
+    """Lee y cachea robots.txt por host y recorre sus sitemaps (incluidos índices)"""
+
+    def __init__(self, session, timeout: int = 15, max_sitemaps: int = 50, max_urls: int = 50000):
+        self.session = session
+        self.user_agent = session.headers.get('User-Agent', '*')
+        self.timeout = timeout
+        self.max_sitemaps = max_sitemaps
+        self.max_urls = max_urls
+        self.robots: Dict[str, Optional[RobotFileParser]] = {}
+        self.lock = threading.Lock()
+        self.host_locks: Dict[str, threading.Lock] = {}
+        self.logger = logging.getLogger(__name__)
+
+    def robots_for(self, url: str) -> Optional[RobotFileParser]:
+        """robots.txt del host de la URL (se descarga una sola vez por host)"""
+        root = host_root(url)
+        with self.lock:
+            if root in self.robots:
+                return self.robots[root]
+            host_lock = self.host_locks.setdefault(root, threading.Lock())
+
+        # Un lock por host: otros hosts no esperan a esta descarga
+        with host_lock:
+            if root not in self.robots:
+                self.robots[root] = self.fetch_robots(root)
+            return self.robots[root]
+
+    def fetch_robots(self, root: str) -> Optional[RobotFileParser]:
+        """Descarga y parsea robots.txt; None si el host no responde"""
+        parser = RobotFileParser(f"{root}/robots.txt")
+        try:
+            response = self.session.get(parser.url, timeout=self.timeout)
+        except Exception as e:
+            self.logger.warning(f"No se pudo leer {parser.url}: {str(e)}")
+            return None
+
+        # Mismo criterio que RobotFileParser.read()
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        return parser
+
+    def can_fetch(self, url: str) -> bool:
+        """Indica si robots.txt permite descargar la URL"""
+        parser = self.robots_for(url)
+        return parser.can_fetch(self.user_agent, url) if parser else True
+
+    def crawl_delay(self, url: str) -> float:
+        """Crawl-delay declarado para el host de la URL (0 si no hay)"""
+        parser = self.robots_for(url)
+        if not parser:
+            return 0.0
+        delay = parser.crawl_delay(self.user_agent)
+        return float(delay) if delay else 0.0
+
+    def sitemaps_for(self, url: str) -> List[str]:
+        """Sitemaps declarados en robots.txt, o /sitemap.xml por defecto"""
+        parser = self.robots_for(url)
+        declared = parser.site_maps() if parser else None
+        return declared or [f"{host_root(url)}/sitemap.xml"]
+
+    def iter_sitemap(self, sitemap_url: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Recorre un sitemap (y los sitemaps que enlace) devolviendo (url, lastmod)"""
+        pending = deque([sitemap_url])
+        visited = set()
+
+        while pending and len(visited) < self.max_sitemaps:
+            current = pending.popleft()
+            if current in visited:
+                continue
+            visited.add(current)
+
+            try:
+                response = self.session.get(current, timeout=self.timeout)
+                response.raise_for_status()
+                content = response.content
+                if content[:2] == b'\x1f\x8b':
+                    content = gzip.decompress(content)
+                root = ET.fromstring(content)
+            except Exception as e:
+                self.logger.warning(f"Sitemap ignorado {current}: {str(e)}")
+                continue
+
+            for entry in root:
+                fields = {local_name(child.tag): (child.text or '').strip() for child in entry}
+                loc = fields.get('loc')
+                if not loc:
+                    continue
+                if local_name(entry.tag) == 'sitemap':
+                    pending.append(urljoin(current, loc))
+                else:
+                    yield loc, fields.get('lastmod') or None
+
+    def discover(self, seed_urls: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """URLs (con su lastmod) de los sitemaps de todos los hosts de las semillas"""
+        entries = []
+        roots = list(dict.fromkeys(host_root(url) for url in seed_urls))
+        for root in roots:
+            # Alcanzado el tope no se descargan más sitemaps (ni de este host ni de los siguientes)
+            if len(entries) >= self.max_urls:
+                break
+            host_entries = 0
+            for sitemap_url in self.sitemaps_for(root):
+                if len(entries) >= self.max_urls:
+                    break
+                for loc, lastmod in self.iter_sitemap(sitemap_url):
+                    entries.append((loc, lastmod))
+                    host_entries += 1
+                    if len(entries) >= self.max_urls:
+                        break
+            self.logger.info(f"🗺️ {root}: {host_entries} URLs en sitemaps")
+        return entries
@@ -0,0 +1,75 @@
+"""
+Búsqueda híbrida (vectorial + BM25) sobre el backend por defecto (Chroma).
+
+El modelo de embeddings se sustituye por uno determinista de bolsa de
+palabras para no descargar nada; el almacén es un Chroma real.
+"""
+import hashlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip('chromadb')
+
+from knowledge_base import KnowledgeBase
+
+
+class HashingEncoder:
+    """Bolsa de palabras con hashing: suficiente para que la búsqueda sea estable"""
+
+    dim = 64
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+
+TOPICS = ['matrícula', 'becas', 'biblioteca', 'PAU', 'TFG', 'erasmus']
+
+
+@pytest.fixture
+def knowledge_base(tmp_path):
+    kb = KnowledgeBase(db_path=str(tmp_path / 'db'), vector_backend='chroma',
+                       embedding_cache_path=str(tmp_path / 'embedding_cache'))
+    kb._encoder = HashingEncoder()
+    kb.add_documents([
+        {'url': f'https://www.unex.es/{topic.lower()}', 'title': topic,
+         'content': f'Información sobre {topic} en la Universidad de Extremadura. '
+                    f'El trámite de {topic} se realiza en la secretaría virtual.'}
+        for topic in TOPICS
+    ])
+    return kb
+
+
+def test_hybrid_when_bm25_adds_nothing_new(knowledge_base):
+    # Con pocos chunks todos los resultados de BM25 ya están en los vectoriales
+    results = knowledge_base.search('plazo de matrícula', n_results=len(TOPICS), mode='hybrid')
+    assert results
+    assert len({result['id'] for result in results}) == len(results)
+    assert all('fusion_score' in result for result in results)
+
+
+def test_hybrid_fetches_lexical_only_hits(knowledge_base):
+    results = knowledge_base.search('erasmus', n_results=1, mode='hybrid')
+    assert results[0]['metadata']['title'] == 'erasmus'
+
+
+def test_store_get_with_no_ids(knowledge_base):
+    assert knowledge_base.store.get([]) == []
+    assert knowledge_base.store.existing([]) == set()
+
+
+def test_hybrid_with_where_filter(knowledge_base):
+    where = {'url': 'https://www.unex.es/becas'}
+    for _ in range(2):
+        # La segunda vez el conjunto de IDs y la máscara BM25 salen de la caché
+        results = knowledge_base.search('trámite en la secretaría', n_results=3, mode='hybrid', where=where)
+        assert [result['metadata']['url'] for result in results] == [where['url']]
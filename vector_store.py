@@ -0,0 +1,629 @@
+"""
+Backends de almacenamiento vectorial para la base de conocimiento.
+
+Todos exponen la misma interfaz (count, existing, add, update_metadata,
+delete, query, filter_ids, get, iter_rows, reset, save) y devuelven los resultados con el formato
+de KnowledgeBase.search: {'id', 'content', 'metadata', 'score'}, donde score
+es la distancia L2 al cuadrado (como la de Chroma por defecto).
+
+query y filter_ids aceptan un filtro `where` sobre los metadatos con la
+sintaxis de Chroma: {'host': 'alumnado.unex.es'},
+{'scraped_at': {'$gte': 1700000000}}, {'content_type': {'$in': ['html', 'pdf']}}
+o combinaciones con '$and' / '$or'. Varias claves en el mismo dict equivalen a '$and'.
+"""
+import json
+import operator
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import numpy as np
+
+# chromadb y faiss se importan al crear el primer almacén que los usa
+faiss = None
+
+VECTOR_BACKENDS = ['chroma', 'faiss-flat', 'faiss-hnsw', 'faiss-ivf']
+# none = float32; fp16 = media precisión; int8 = cuantización escalar con rango por dimensión
+QUANTIZATIONS = ['none', 'fp16', 'int8']
+
+
+FILTER_OPERATORS = {
+    '$eq': operator.eq,
+    '$ne': operator.ne,
+    '$gt': operator.gt,
+    '$gte': operator.ge,
+    '$lt': operator.lt,
+    '$lte': operator.le,
+    '$in': lambda value, options: value in options,
+    '$nin': lambda value, options: value not in options
+}
+
+
+def match_where(metadata: Dict[str, Any], where: Dict) -> bool:
+    """Evalúa un filtro `where` (sintaxis de Chroma) sobre los metadatos de un chunk"""
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(match_where(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(match_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            # Un campo que no existe no cumple ninguna condición (como en Chroma)
+            if key not in metadata:
+                return False
+            if not isinstance(condition, dict):
+                condition = {'$eq': condition}
+            for op, operand in condition.items():
+                if op not in FILTER_OPERATORS:
+                    raise ValueError(f"Unknown filter operator: {op}")
+                try:
+                    if not FILTER_OPERATORS[op](metadata[key], operand):
+                        return False
+                except TypeError:
+                    return False
+    return True
+
+
+def chroma_where(where: Dict) -> Dict:
+    """Chroma solo admite una clave por nivel: varias se agrupan en '$and'"""
+    clauses = []
+    for key, condition in where.items():
+        if key in ('$and', '$or'):
+            clauses.append({key: [chroma_where(clause) for clause in condition]})
+        else:
+            clauses.append({key: condition})
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def where_key(where: Dict) -> str:
+    return json.dumps(where, sort_keys=True, default=str)
+
+
+def import_faiss():
+    """Importa faiss (opcional) la primera vez que se necesita"""
+    global faiss
+    if faiss is None:
+        try:
+            import faiss as faiss_module
+        except ImportError:
+            raise ImportError("faiss-cpu is required for the FAISS vector backends")
+        faiss = faiss_module
+    return faiss
+
+
+class ChromaStore:
+    """Colección persistente de Chroma (vectores, metadatos y texto en SQLite)"""
+
+    def __init__(self, path: str, model_name: str, collection_name: str = "unex_content"):
+        self.path = path
+        self.model_name = model_name
+        self.collection_name = collection_name
+        import chromadb
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.open_collection()
+        # where serializado -> IDs que lo cumplen (se vacía con cada cambio)
+        self.filter_cache: Dict[str, Set[str]] = {}
+
+    def open_collection(self):
+        # Los embeddings se pasan siempre calculados: sin embedding_function
+        # Chroma no carga su modelo por defecto
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"description": "Universidad de Extremadura content", "embedding_model": self.model_name},
+            embedding_function=None
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def existing(self, ids: List[str]) -> Set[str]:
+        if not ids:
+            return set()
+        return set(self.collection.get(ids=ids, include=[])['ids'])
+
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        self.collection.add(ids=ids, embeddings=embeddings.tolist(), documents=documents, metadatas=metadatas)
+        self.filter_cache.clear()
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+        # Chroma fusiona los metadatos nuevos con los guardados: los campos que
+        # ya no existen se borran pasándolos como None
+        current = self.collection.get(ids=ids, include=['metadatas'])
+        stored_keys = {doc_id: set(metadata or {}) for doc_id, metadata in zip(current['ids'], current['metadatas'])}
+        metadatas = [dict({key: None for key in stored_keys.get(doc_id, set()) - set(metadata)}, **metadata)
+                     for doc_id, metadata in zip(ids, metadatas)]
+        self.collection.update(ids=ids, metadatas=metadatas)
+        self.filter_cache.clear()
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+        self.filter_cache.clear()
+
+    def query(self, embeddings: np.ndarray, n_results: int, where: Optional[Dict] = None) -> List[List[Dict]]:
+        # El filtro lo aplica Chroma antes de ordenar por distancia
+        results = self.collection.query(query_embeddings=embeddings.tolist(), n_results=n_results,
+                                        where=chroma_where(where) if where else None)
+        formatted = []
+        for i in range(len(embeddings)):
+            documents = results['documents'][i] if results['documents'] else []
+            formatted.append([
+                {
+                    'id': results['ids'][i][j],
+                    'content': doc,
+                    'metadata': results['metadatas'][i][j],
+                    'score': results['distances'][i][j] if results['distances'] else None
+                }
+                for j, doc in enumerate(documents)
+            ])
+        return formatted
+
+    def filter_ids(self, where: Dict) -> Set[str]:
+        """IDs de los chunks que cumplen el filtro (el mismo conjunto hasta el siguiente cambio)"""
+        key = where_key(where)
+        ids = self.filter_cache.get(key)
+        if ids is None:
+            ids = set(self.collection.get(where=chroma_where(where), include=[])['ids'])
+            if len(self.filter_cache) >= 64:
+                self.filter_cache.clear()
+            self.filter_cache[key] = ids
+        return ids
+
+    def get(self, ids: List[str]) -> List[Dict]:
+        """Chunks por id, en el mismo orden (se omiten los que no existen)"""
+        # Chroma rechaza una lista vacía (o devuelve toda la colección, según la versión)
+        if not ids:
+            return []
+        results = self.collection.get(ids=ids, include=['documents', 'metadatas'])
+        found = {
+            doc_id: {'id': doc_id, 'content': doc, 'metadata': metadata}
+            for doc_id, doc, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        }
+        return [found[doc_id] for doc_id in ids if doc_id in found]
+
+    def iter_rows(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict]]]:
+        """Todos los chunks por lotes: (ids, embeddings, textos, metadatos)"""
+        offset = 0
+        while True:
+            batch = self.collection.get(include=['embeddings', 'documents', 'metadatas'],
+                                        limit=batch_size, offset=offset)
+            if not batch['ids']:
+                return
+            yield (batch['ids'], np.asarray(batch['embeddings'], dtype=np.float32),
+                   batch['documents'], batch['metadatas'])
+            offset += len(batch['ids'])
+
+    def reset(self):
+        self.client.delete_collection(self.collection_name)
+        self.collection = self.open_collection()
+        self.filter_cache.clear()
+
+    def save(self):
+        """Chroma persiste cada operación"""
+
+
+class FaissStore:
+    """Índice FAISS (plano, HNSW o IVF) con metadatos y texto en un archivo aparte.
+
+    Cada chunk ocupa una fila; el id interno de FAISS es el número de fila.
+    Los borrados marcan la fila como vacía y la búsqueda en el índice la
+    descarta con un IDSelector de filas borradas (uno solo, rehecho cuando el
+    almacén cambia); cuando las filas vacías superan compact_ratio se
+    eliminan y el índice se reconstruye sin ellas. Un índice
+    IVF también se reconstruye cuando la colección crece tanto que su número
+    de listas se queda corto. Los vectores se guardan en vectors.npy y se
+    abren mapeados en memoria.
+
+    Con quantization='fp16' o 'int8' el índice guarda los vectores comprimidos
+    (2 o 1 byte por dimensión): la búsqueda sobre ellos da una lista de
+    rerank_factor veces más candidatos, que se reordenan con la distancia
+    exacta contra los float32 de vectors.npy (solo se leen esas filas).
+
+    Con un filtro `where` las filas que lo cumplen se calculan una vez (y se
+    cachean hasta el siguiente cambio): si son como mucho exact_filter_limit
+    se puntúan solo ellas con la distancia exacta (su submatriz también se
+    cachea, hasta subset_cache_bytes en total); si son más, FAISS busca en el
+    índice descartando el resto con un IDSelector, también cacheado.
+    """
+
+    def __init__(self, path: str, dim: int, index_type: str = 'flat', hnsw_m: int = 32,
+                 ef_construction: int = 80, ef_search: int = 64, nprobe: int = 8,
+                 compact_ratio: float = 0.1, quantization: str = 'none', rerank_factor: int = 4,
+                 exact_filter_limit: int = 20000, subset_cache_bytes: int = 256 * 1024 * 1024):
+        import_faiss()
+        if index_type not in ('flat', 'hnsw', 'ivf'):
+            raise ValueError(f"Unknown FAISS index type: {index_type}")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization} (expected one of {QUANTIZATIONS})")
+        self.path = path
+        self.dim = dim
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.compact_ratio = compact_ratio
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.exact_filter_limit = exact_filter_limit
+        self.subset_cache_bytes = subset_cache_bytes
+        self.store_path = os.path.join(path, "store.json")
+        self.vectors_path = os.path.join(path, "vectors.npy")
+        self.index_path = os.path.join(path, "index.faiss")
+        self.lock = threading.RLock()
+        self.logger = logging.getLogger(__name__)
+        self.load()
+
+    def load(self):
+        """Abre el índice guardado, si existe y es de la misma dimensión"""
+        self.ids: List = []
+        self.documents: List = []
+        self.metadatas: List = []
+        self.row_of: Dict[str, int] = {}
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.pending: List[np.ndarray] = []
+        self.deleted = 0
+        self.index = None
+        self.dirty = False
+        # where serializado -> filas que lo cumplen / sus IDs / su submatriz
+        # (vectores, normas²) / sus parámetros de búsqueda con IDSelector
+        self.filter_cache: Dict[str, np.ndarray] = {}
+        self.filter_id_cache: Dict[str, Set[str]] = {}
+        self.subset_cache: OrderedDict = OrderedDict()
+        self.selector_cache: Dict[str, Tuple] = {}
+        # Parámetros de búsqueda que descartan las filas borradas
+        self.live_params = None
+
+        if not os.path.exists(self.store_path) or not os.path.exists(self.vectors_path):
+            return
+        with open(self.store_path, 'r', encoding='utf-8') as f:
+            store = json.load(f)
+        if store.get('dim') != self.dim:
+            self.logger.warning(f"FAISS store {self.path} has dimension {store.get('dim')}, expected {self.dim}; ignoring it")
+            return
+
+        vectors = np.load(self.vectors_path, mmap_mode='r')
+        if len(vectors) != len(store['ids']):
+            self.logger.warning(f"FAISS store {self.path} is inconsistent; ignoring it")
+            return
+
+        self.ids = store['ids']
+        self.documents = store['documents']
+        self.metadatas = store['metadatas']
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids) if doc_id is not None}
+        self.deleted = len(self.ids) - len(self.row_of)
+        self.vectors = vectors
+        same_index = (store.get('index_type') == self.index_type
+                      and store.get('quantization', 'none') == self.quantization)
+        if same_index and os.path.exists(self.index_path):
+            index = faiss.read_index(self.index_path)
+            # Un índice que no cubre todas las filas se reconstruye al usarlo
+            if index.ntotal == len(self.ids):
+                self.index = index
+                self.set_search_params()
+        self.logger.info(f"Loaded FAISS {self.index_type} store with {len(self.row_of)} chunks")
+
+    def all_vectors(self) -> np.ndarray:
+        """Matriz completa de vectores (guardados + pendientes de guardar)"""
+        if self.pending:
+            self.vectors = np.concatenate([self.vectors] + self.pending)
+            self.pending = []
+        return self.vectors
+
+    def set_search_params(self):
+        if self.index_type == 'hnsw':
+            self.index.hnsw.efSearch = self.ef_search
+        elif self.index_type == 'ivf':
+            self.index.nprobe = self.nprobe
+
+    def build_index(self):
+        """Construye el índice con todas las filas (las vacías se filtran al buscar)"""
+        vectors = np.ascontiguousarray(self.all_vectors(), dtype=np.float32)
+        qtype = {'fp16': faiss.ScalarQuantizer.QT_fp16,
+                 'int8': faiss.ScalarQuantizer.QT_8bit}.get(self.quantization)
+        if self.index_type == 'hnsw':
+            if qtype is None:
+                index = faiss.IndexHNSWFlat(self.dim, self.hnsw_m)
+            else:
+                index = faiss.IndexHNSWSQ(self.dim, qtype, self.hnsw_m)
+            index.hnsw.efConstruction = self.ef_construction
+        elif self.index_type == 'ivf':
+            nlist = self.ivf_nlist(len(vectors))
+            self.quantizer = faiss.IndexFlatL2(self.dim)
+            if qtype is None:
+                index = faiss.IndexIVFFlat(self.quantizer, self.dim, nlist, faiss.METRIC_L2)
+            else:
+                index = faiss.IndexIVFScalarQuantizer(self.quantizer, self.dim, nlist, qtype, faiss.METRIC_L2)
+        elif qtype is None:
+            index = faiss.IndexFlatL2(self.dim)
+        else:
+            index = faiss.IndexScalarQuantizer(self.dim, qtype, faiss.METRIC_L2)
+        if len(vectors):
+            if not index.is_trained:
+                index.train(vectors)
+            index.add(vectors)
+        self.index = index
+        self.set_search_params()
+
+    @staticmethod
+    def ivf_nlist(rows: int) -> int:
+        """~4·sqrt(n) listas, con al menos 39 vectores de entrenamiento por lista"""
+        return max(1, min(int(4 * np.sqrt(rows)), rows // 39))
+
+    def count(self) -> int:
+        return len(self.row_of)
+
+    def existing(self, ids: List[str]) -> Set[str]:
+        with self.lock:
+            return {doc_id for doc_id in ids if doc_id in self.row_of}
+
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self.lock:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                self.row_of[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                self.documents.append(document)
+                self.metadatas.append(metadata)
+            self.pending.append(embeddings)
+            self.dirty = True
+            self.clear_filters()
+            # IVF sin entrenar (índice vacío) se construye al buscar o guardar
+            if self.index is not None and self.index.is_trained and self.index.ntotal:
+                self.index.add(embeddings)
+            else:
+                self.index = None
+            # Las listas de IVF se calcularon para una colección mucho menor: reconstruir
+            if (self.index is not None and self.index_type == 'ivf'
+                    and self.ivf_nlist(len(self.row_of)) >= 2 * self.index.nlist):
+                self.index = None
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+        with self.lock:
+            for doc_id, metadata in zip(ids, metadatas):
+                self.metadatas[self.row_of[doc_id]] = metadata
+            self.dirty = True
+            self.clear_filters()
+
+    def delete(self, ids: List[str]):
+        with self.lock:
+            for doc_id in ids:
+                row = self.row_of.pop(doc_id, None)
+                if row is not None:
+                    self.ids[row] = self.documents[row] = self.metadatas[row] = None
+                    self.deleted += 1
+                    self.dirty = True
+            self.clear_filters()
+            if self.deleted > self.compact_ratio * max(len(self.ids), 1):
+                self.compact()
+
+    def query(self, embeddings: np.ndarray, n_results: int, where: Optional[Dict] = None) -> List[List[Dict]]:
+        with self.lock:
+            if not self.row_of:
+                return [[] for _ in range(len(embeddings))]
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            if where:
+                distances, rows = self.filtered_search(embeddings, n_results, where)
+            else:
+                if self.index is None:
+                    self.build_index()
+                # Con vectores comprimidos se piden de más para reordenar con la distancia exacta
+                k = n_results
+                if self.quantization != 'none':
+                    k *= self.rerank_factor
+                k = min(k, self.index.ntotal)
+                if self.deleted:
+                    # Las filas borradas siguen en el índice: las descarta el selector
+                    if self.live_params is None:
+                        dead = np.array([row for row, doc_id in enumerate(self.ids) if doc_id is None], dtype=np.int64)
+                        batch = faiss.IDSelectorBatch(dead)
+                        selector = faiss.IDSelectorNot(batch)
+                        # Se guardan los selectores con los parámetros para que no se liberen
+                        self.live_params = (self.search_params(selector), selector, batch)
+                    distances, rows = self.index.search(embeddings, k, params=self.live_params[0])
+                else:
+                    distances, rows = self.index.search(embeddings, k)
+                if self.quantization != 'none':
+                    distances, rows = self.rerank(embeddings, rows)
+
+            results = []
+            for row_distances, row_ids in zip(distances, rows):
+                hits = []
+                for distance, row in zip(row_distances, row_ids):
+                    if row < 0 or self.ids[row] is None:
+                        continue
+                    hits.append({'id': self.ids[row], 'content': self.documents[row],
+                                 'metadata': self.metadatas[row], 'score': float(distance)})
+                    if len(hits) == n_results:
+                        break
+                results.append(hits)
+            return results
+
+    def matching_rows(self, where: Dict) -> np.ndarray:
+        """Filas vivas que cumplen el filtro, en orden creciente"""
+        key = where_key(where)
+        rows = self.filter_cache.get(key)
+        if rows is None:
+            rows = np.array([row for row, metadata in enumerate(self.metadatas)
+                             if metadata is not None and match_where(metadata, where)], dtype=np.int64)
+            if len(self.filter_cache) >= 64:
+                self.filter_cache.clear()
+            self.filter_cache[key] = rows
+        return rows
+
+    def clear_filters(self):
+        self.filter_cache.clear()
+        self.filter_id_cache.clear()
+        self.subset_cache.clear()
+        self.selector_cache.clear()
+        self.live_params = None
+
+    def search_params(self, selector):
+        """Parámetros de búsqueda del tipo de índice con un IDSelector"""
+        if self.index_type == 'hnsw':
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        if self.index_type == 'ivf':
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        return faiss.SearchParameters(sel=selector)
+
+    def subset(self, key: str, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectores y normas² de las filas de un filtro (se copian una vez por filtro)"""
+        cached = self.subset_cache.get(key)
+        if cached is not None:
+            self.subset_cache.move_to_end(key)
+            return cached
+        vectors = np.asarray(self.all_vectors()[rows], dtype=np.float32)
+        cached = (vectors, (vectors ** 2).sum(axis=1))
+        if vectors.nbytes <= self.subset_cache_bytes:
+            self.subset_cache[key] = cached
+            while sum(entry[0].nbytes for entry in self.subset_cache.values()) > self.subset_cache_bytes:
+                self.subset_cache.popitem(last=False)
+        return cached
+
+    def filter_ids(self, where: Dict) -> Set[str]:
+        """IDs de los chunks que cumplen el filtro (el mismo conjunto hasta el siguiente cambio)"""
+        key = where_key(where)
+        with self.lock:
+            ids = self.filter_id_cache.get(key)
+            if ids is None:
+                ids = {self.ids[row] for row in self.matching_rows(where)}
+                if len(self.filter_id_cache) >= 64:
+                    self.filter_id_cache.clear()
+                self.filter_id_cache[key] = ids
+            return ids
+
+    def filtered_search(self, embeddings: np.ndarray, n_results: int, where: Dict):
+        """Vecinos más cercanos entre las filas que cumplen el filtro"""
+        key = where_key(where)
+        rows = self.matching_rows(where)
+        if not len(rows):
+            return [[] for _ in embeddings], [[] for _ in embeddings]
+        if len(rows) <= self.exact_filter_limit:
+            # Pocas filas: distancia exacta solo sobre ellas, sin recorrer el índice
+            vectors, sq_norms = self.subset(key, rows)
+            distances = sq_norms[None, :] - 2.0 * (embeddings @ vectors.T)
+            distances += (embeddings ** 2).sum(axis=1)[:, None]
+            k = min(n_results, len(rows))
+            top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            top_distances = np.take_along_axis(distances, top, axis=1)
+            order = np.argsort(top_distances, axis=1)
+            return (np.maximum(np.take_along_axis(top_distances, order, axis=1), 0.0),
+                    rows[np.take_along_axis(top, order, axis=1)])
+
+        # Muchas filas: el índice descarta las demás durante la búsqueda
+        if self.index is None:
+            self.build_index()
+        cached = self.selector_cache.get(key)
+        if cached is None:
+            selector = faiss.IDSelectorBatch(rows)
+            cached = (self.search_params(selector), selector)
+            if len(self.selector_cache) >= 64:
+                self.selector_cache.clear()
+            self.selector_cache[key] = cached
+        k = n_results * (self.rerank_factor if self.quantization != 'none' else 1)
+        distances, found = self.index.search(embeddings, min(k, len(rows)), params=cached[0])
+        if self.quantization != 'none':
+            return self.rerank(embeddings, found)
+        return distances, found
+
+    def rerank(self, embeddings: np.ndarray, candidates: np.ndarray):
+        """Distancias L2 exactas (float32) de los candidatos, ordenadas"""
+        vectors = self.all_vectors()
+        all_distances, all_rows = [], []
+        for query, rows in zip(embeddings, candidates):
+            # Filas en orden creciente: lecturas secuenciales del archivo mapeado
+            rows = np.sort(rows[rows >= 0])
+            distances = ((np.asarray(vectors[rows]) - query) ** 2).sum(axis=1)
+            order = np.argsort(distances)
+            all_distances.append(distances[order])
+            all_rows.append(rows[order])
+        return all_distances, all_rows
+
+    def memory_bytes(self) -> int:
+        """Tamaño del índice residente en memoria (vectors.npy queda en disco)"""
+        with self.lock:
+            if self.index is None:
+                self.build_index()
+            return int(faiss.serialize_index(self.index).nbytes)
+
+    def vectors_bytes(self) -> int:
+        """Tamaño de los float32 de vectors.npy (reordenación y filtros exactos)"""
+        with self.lock:
+            return int(self.all_vectors().nbytes)
+
+    def get(self, ids: List[str]) -> List[Dict]:
+        """Chunks por id, en el mismo orden (se omiten los que no existen)"""
+        with self.lock:
+            rows = [self.row_of[doc_id] for doc_id in ids if doc_id in self.row_of]
+            return [{'id': self.ids[row], 'content': self.documents[row], 'metadata': self.metadatas[row]}
+                    for row in rows]
+
+    def iter_rows(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict]]]:
+        """Todos los chunks vivos por lotes: (ids, embeddings, textos, metadatos)"""
+        with self.lock:
+            vectors = self.all_vectors()
+            live = [row for row, doc_id in enumerate(self.ids) if doc_id is not None]
+            for start in range(0, len(live), batch_size):
+                rows = live[start:start + batch_size]
+                yield ([self.ids[row] for row in rows], np.asarray(vectors[rows], dtype=np.float32),
+                       [self.documents[row] for row in rows], [self.metadatas[row] for row in rows])
+
+    def reset(self):
+        with self.lock:
+            for path in (self.store_path, self.vectors_path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.load()
+
+    def compact(self):
+        """Elimina las filas borradas y renumera"""
+        live = [row for row, doc_id in enumerate(self.ids) if doc_id is not None]
+        self.vectors = np.array(self.all_vectors()[live], dtype=np.float32)
+        self.ids = [self.ids[row] for row in live]
+        self.documents = [self.documents[row] for row in live]
+        self.metadatas = [self.metadatas[row] for row in live]
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.deleted = 0
+        self.index = None
+        self.clear_filters()
+
+    def save(self):
+        """Guarda vectores, metadatos e índice (archivos temporales + rename)"""
+        with self.lock:
+            if not self.dirty:
+                return
+            # Almacenes guardados con más filas vacías de la cuenta
+            if self.deleted > self.compact_ratio * max(len(self.ids), 1):
+                self.compact()
+            vectors = self.all_vectors()
+            if self.index is None:
+                self.build_index()
+
+            os.makedirs(self.path, exist_ok=True)
+            with open(f"{self.vectors_path}.tmp", 'wb') as f:
+                np.save(f, np.asarray(vectors, dtype=np.float32))
+            os.replace(f"{self.vectors_path}.tmp", self.vectors_path)
+            faiss.write_index(self.index, f"{self.index_path}.tmp")
+            os.replace(f"{self.index_path}.tmp", self.index_path)
+            with open(f"{self.store_path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump({'dim': self.dim, 'index_type': self.index_type,
+                           'quantization': self.quantization, 'ids': self.ids,
+                           'documents': self.documents, 'metadatas': self.metadatas},
+                          f, ensure_ascii=False)
+            os.replace(f"{self.store_path}.tmp", self.store_path)
+            self.vectors = np.load(self.vectors_path, mmap_mode='r')
+            self.dirty = False
+
+
+def create_store(backend: str, db_path: str, dim: Optional[int], model_name: str, quantization: str = 'none'):
+    """Crea el backend indicado ('chroma', 'faiss-flat', 'faiss-hnsw' o 'faiss-ivf')"""
+    if backend == 'chroma':
+        if quantization != 'none':
+            raise ValueError("Quantized vectors require a FAISS backend")
+        return ChromaStore(db_path, model_name)
+    if backend.startswith('faiss-'):
+        index_type = backend.split('-', 1)[1]
+        return FaissStore(os.path.join(db_path, f"faiss_{index_type}"), dim, index_type=index_type,
+                          quantization=quantization)
+    raise ValueError(f"Unknown vector backend: {backend} (expected one of {VECTOR_BACKENDS})")
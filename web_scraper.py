@@ -1,29 +1,200 @@
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString, CData
 import time
 import logging
-from urllib.parse import urljoin, urlparse, quote
+from urllib.parse import urljoin, urlparse, quote, urlsplit, urlunsplit, parse_qsl, urlencode
 from typing import List, Set, Dict, Optional
 import json
 import re
-import tempfile
 import os
+import sys
 from pathlib import Path
 import fitz  # PyMuPDF - mejor que PyPDF2
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
 import hashlib
+import asyncio
+import threading
+from collections import deque
+from requests.adapters import HTTPAdapter
+from fetch_cache import FetchCache
+from corpus_store import CorpusWriter, iter_corpus, save_checkpoint, load_checkpoint
+from sitemaps import SiteDiscovery
+from crawl_metrics import CrawlMetrics
+
+# lxml es bastante más rápido que html.parser; se usa si está instalado
+try:
+    import lxml  # noqa: F401
+    DEFAULT_HTML_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_HTML_PARSER = 'html.parser'
+
+# URLs de PDF escritas como texto dentro de la página
+PDF_TEXT_PATTERN = re.compile(r'https?://[^\s<>"]+\.pdf[^\s<>"]*', re.IGNORECASE)
+
+# Parámetros de query que no cambian el contenido de la página
+TRACKING_PARAMS = re.compile(r'^(utm(_\w+)?|fbclid|gclid|mc_cid|mc_eid|_ga)$', re.I)
+
+
+def canonicalize_url(url: str) -> str:
+    """Normaliza una URL para deduplicar: sin fragmento, sin parámetros de seguimiento y sin barra final"""
+    parsed = urlsplit(url.strip())
+    scheme = parsed.scheme.lower()
+    netloc = parsed.netloc.lower()
+    
+    # Quitar el puerto por defecto
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    
+    path = re.sub(r'/{2,}', '/', parsed.path) or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    
+    # Ordenar la query para que el orden de los parámetros no genere duplicados
+    params = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+              if not TRACKING_PARAMS.match(k)]
+    query = urlencode(sorted(params))
+    
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+class ContentTooLarge(Exception):
+    """La respuesta supera el tamaño máximo permitido"""
+
+
+def extract_pdf_pages(source, start: int, end: int) -> str:
+    """Extrae el texto de las páginas [start, end) de un PDF.
+    
+    `source` puede ser un documento abierto o los bytes del PDF; con bytes la
+    función es apta para ejecutarse en un pool de procesos.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        with fitz.open(stream=source, filetype="pdf") as doc:
+            return extract_pdf_pages(doc, start, end)
+    
+    return "\n".join(source[page_num].get_text() for page_num in range(start, end))
+
+
+class CrawlFrontier:
+    """Colas FIFO de páginas y PDFs con un índice de URLs canónicas compartido"""
+
+    def __init__(self, seeds: Optional[List[str]] = None, max_pending: int = 100):
+        self.max_pending = max_pending
+        self.pages: deque = deque()
+        self.pdfs: deque = deque()
+        self.seen: Set[str] = set()
+        
+        for url in seeds or []:
+            self.add_page(url, seed=True)
+
+    def add_page(self, url: str, seed: bool = False) -> bool:
+        """Encola una página si no se ha visto antes y hay hueco en la cola.
+        
+        Las semillas (URLs prioritarias y de sitemaps) no cuentan para max_pending,
+        que solo limita los enlaces descubiertos al recorrer páginas.
+        """
+        key = canonicalize_url(url)
+        if key in self.seen or (not seed and len(self.pages) >= self.max_pending):
+            return False
+        self.seen.add(key)
+        self.pages.append(url)
+        return True
+
+    def add_pdf(self, url: str) -> bool:
+        """Encola un PDF si no se ha visto antes (como PDF o como página)"""
+        key = canonicalize_url(url)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.pdfs.append(url)
+        return True
+
+    def pop_page(self) -> Optional[str]:
+        """Saca la siguiente página en orden de llegada"""
+        return self.pages.popleft() if self.pages else None
+
+    def pop_pdf(self) -> Optional[str]:
+        """Saca el siguiente PDF en orden de llegada"""
+        return self.pdfs.popleft() if self.pdfs else None
+
+
+class HostRateLimiter:
+    """Limita la concurrencia y el ritmo de peticiones a un mismo host"""
+
+    def __init__(self, concurrency: int = 2, delay: float = 0.3):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        # Reservar el siguiente hueco libre respetando la pausa mínima entre peticiones
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
 
 class EnhancedWebScraper:
-    def __init__(self, base_url: str = "https://www.unex.es/", max_pages: int = 200):
+    def __init__(self, base_url: str = "https://www.unex.es/", max_pages: int = 200,
+                 max_concurrency: int = 8, per_host_concurrency: int = 2,
+                 per_host_delay: float = 0.3, max_pdfs: int = 50,
+                 cache_path: Optional[str] = "fetch_cache.json",
+                 max_pdf_bytes: int = 25 * 1024 * 1024, max_pdf_pages: int = 150,
+                 corpus_path: Optional[str] = None, checkpoint_interval: float = 30.0,
+                 html_parser: str = DEFAULT_HTML_PARSER,
+                 use_sitemaps: bool = True, respect_robots: bool = True,
+                 allowed_domain: str = "unex.es"):
         self.base_url = base_url
+        self.allowed_domain = allowed_domain
+        self.html_parser = html_parser
         self.max_pages = max_pages
+        self.max_pdfs = max_pdfs
+        
+        # Presupuesto por PDF: documentos más grandes se omiten o se truncan
+        self.max_pdf_bytes = max_pdf_bytes
+        self.max_pdf_pages = max_pdf_pages
+        self.pdf_timeout = 60
+        # PDFs con más páginas que esto se reparten en el pool de procesos
+        self.pdf_pages_per_task = 20
+        self.pdf_workers = os.cpu_count() or 2
+        self.pdf_pool: Optional[ProcessPoolExecutor] = None
+        
+        # Límites del modo concurrente
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay = per_host_delay
+        
+        # URLs canónicas ya descargadas (ver canonicalize_url)
         self.visited_urls: Set[str] = set()
         self.visited_pdfs: Set[str] = set()
+        self.frontier = CrawlFrontier()
+        self.pdfs_started = 0
         self.content_data: List[dict] = []
+        
+        # Corpus en streaming: con corpus_path cada registro se escribe en JSONL al
+        # terminar su extracción (y no se guarda en content_data)
+        self.corpus_path = corpus_path
+        self.checkpoint_path = f"{corpus_path}.checkpoint" if corpus_path else None
+        self.checkpoint_interval = checkpoint_interval
+        self.corpus_writer: Optional[CorpusWriter] = None
+        self.last_checkpoint = 0.0
+        self.records_count = 0
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # Pool de conexiones suficiente para todas las descargas simultáneas
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         
         # URLs importantes de la UEx
         self.priority_urls = [
@@ -53,7 +224,21 @@ class EnhancedWebScraper:
         )
         self.logger = logging.getLogger(__name__)
         
-        # Estadísticas
+        # Caché de descargas para recrawls incrementales (None para desactivarla)
+        self.fetch_cache = FetchCache(cache_path) if cache_path else None
+        
+        # robots.txt (reglas y Crawl-delay) y sitemaps de cada host
+        self.use_sitemaps = use_sitemaps
+        self.respect_robots = respect_robots
+        self.discovery = SiteDiscovery(self.session)
+        self.sitemap_lastmod: Dict[str, str] = {}
+        self.robots_blocked = 0
+        
+        # Tiempos por URL y etapa, throughput y errores (ver crawl_metrics.py)
+        self.metrics = CrawlMetrics()
+        
+        # Estadísticas (protegidas por un lock en el modo concurrente)
+        self.stats_lock = threading.Lock()
         self.pdf_count = 0
         self.html_count = 0
         self.total_words = 0
@@ -67,6 +252,7 @@ class EnhancedWebScraper:
             r'formato=pdf',
             r'download.*\.pdf'
         ]
+        self.pdf_regex = re.compile('|'.join(self.pdf_patterns))
         
         # Elementos HTML a ignorar completamente
         self.ignore_elements = [
@@ -80,19 +266,34 @@ class EnhancedWebScraper:
             'header', 'banner', 'advertisement', 'social', 'share',
             'related', 'comments', 'widget', 'plugin'
         ]
+        self.ignore_regex = re.compile('|'.join(self.ignore_classes), re.I)
+        
+        # Contenedores de contenido principal en orden de prioridad
+        self.content_selectors = [
+            'main',
+            '.main-content',
+            '.content',
+            '.post-content',
+            '.entry-content',
+            'article',
+            '.article-content',
+            '#content',
+            '.page-content',
+            '.text-content',
+            '.body-content'
+        ]
 
     def is_valid_unex_url(self, url: str) -> bool:
         """Verifica si la URL pertenece al dominio de la UEx"""
         try:
             parsed = urlparse(url)
-            return 'unex.es' in parsed.netloc and url.startswith(('http://', 'https://'))
+            return self.allowed_domain in parsed.netloc and url.startswith(('http://', 'https://'))
         except:
             return False
 
     def is_pdf_url(self, url: str) -> bool:
         """Detecta si una URL apunta a un PDF usando múltiples patrones"""
-        url_lower = url.lower()
-        return any(re.search(pattern, url_lower) for pattern in self.pdf_patterns)
+        return self.pdf_regex.search(url.lower()) is not None
 
     def clean_text(self, text: str) -> str:
         """Limpia y normaliza el texto extraído de forma agresiva"""
@@ -129,22 +330,8 @@ class EnhancedWebScraper:
                 element.decompose()
         
         # Buscar contenido principal en orden de prioridad
-        content_selectors = [
-            'main',
-            '.main-content',
-            '.content',
-            '.post-content',
-            '.entry-content',
-            'article',
-            '.article-content',
-            '#content',
-            '.page-content',
-            '.text-content',
-            '.body-content'
-        ]
-        
         main_content = ""
-        for selector in content_selectors:
+        for selector in self.content_selectors:
             content_elem = soup.select_one(selector)
             if content_elem:
                 main_content = content_elem.get_text(separator=' ', strip=True)
@@ -188,208 +375,677 @@ class EnhancedWebScraper:
         
         # Buscar patrones de PDF en el texto y atributos onclick
         text_content = soup.get_text()
-        pdf_matches = re.findall(r'https?://[^\s<>"]+\.pdf[^\s<>"]*', text_content, re.IGNORECASE)
+        pdf_matches = PDF_TEXT_PATTERN.findall(text_content)
         for match in pdf_matches:
             if self.is_valid_unex_url(match):
                 pdf_links.add(match)
         
         return list(pdf_links)
 
-    def extract_pdf_content(self, url: str) -> Optional[dict]:
-        """Extrae contenido de un archivo PDF usando PyMuPDF"""
-        try:
-            self.logger.info(f"📄 Procesando PDF: {url}")
+    def parse_html(self, html: bytes, url: str) -> dict:
+        """Extrae título, texto, enlaces internos y PDFs recorriendo el árbol una sola vez.
+        
+        Equivale a extract_text_from_html + find_all_pdf_links + la búsqueda de
+        enlaces internos, pero sin decompose() ni find_all/select_one repetidos:
+        los subárboles ignorados simplemente no se visitan.
+        """
+        with self.metrics.stage('parse'):
+            soup = BeautifulSoup(html, self.html_parser)
+        extract_start = time.perf_counter()
+        
+        ignore_elements = set(self.ignore_elements)
+        selectors = []
+        for selector in self.content_selectors + ['body']:
+            if selector.startswith('.'):
+                selectors.append(('class', selector[1:]))
+            elif selector.startswith('#'):
+                selectors.append(('id', selector[1:]))
+            else:
+                selectors.append(('tag', selector))
+        
+        title = None
+        pieces: List[str] = []
+        # Índice del selector -> [inicio, fin] en `pieces` de su primer elemento
+        ranges: Dict[int, List[int]] = {}
+        pdf_links: Set[str] = set()
+        internal_links: List[str] = []
+        page_links: Set[str] = set()
+        
+        def add_link(href: str, allow_page: bool):
+            full_url = urljoin(url, href)
+            if not self.is_valid_unex_url(full_url):
+                return
+            if self.is_pdf_url(full_url):
+                pdf_links.add(full_url)
+            elif allow_page:
+                key = canonicalize_url(full_url)
+                if key not in self.visited_urls and key not in page_links:
+                    page_links.add(key)
+                    internal_links.append(full_url)
+        
+        # Recorrido en profundidad iterativo; (tag, selectores) marca el cierre de un elemento
+        stack = list(reversed(soup.contents))
+        while stack:
+            node = stack.pop()
             
-            # Verificar si ya procesamos este PDF
-            url_hash = hashlib.md5(url.encode()).hexdigest()
-            if url_hash in self.visited_pdfs:
-                return None
-            self.visited_pdfs.add(url_hash)
+            if isinstance(node, tuple):
+                for index in node[1]:
+                    ranges[index][1] = len(pieces)
+                continue
             
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
+            if isinstance(node, NavigableString):
+                if type(node) in (NavigableString, CData):
+                    text = node.strip()
+                    if text:
+                        pieces.append(text)
+                continue
             
-            # Verificar que el contenido es realmente un PDF
-            if not response.content.startswith(b'%PDF'):
-                self.logger.warning(f"El archivo no parece ser un PDF válido: {url}")
-                return None
+            name = node.name
+            if name in ignore_elements:
+                if name == 'title' and title is None:
+                    title = node.get_text().strip()
+                continue
             
-            # Crear archivo temporal
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                temp_file.write(response.content)
-                temp_file_path = temp_file.name
+            classes = node.get('class')
+            if classes and self.ignore_regex.search(' '.join(classes)):
+                continue
+            element_id = node.get('id')
+            if element_id and self.ignore_regex.search(element_id):
+                continue
+            
+            if name == 'a':
+                href = node.get('href')
+                if href:
+                    add_link(href, allow_page=True)
+            elif name in ('object', 'embed'):
+                src = node.get('src')
+                if src:
+                    add_link(src, allow_page=False)
             
+            matched = []
+            for index, (kind, value) in enumerate(selectors):
+                if index in ranges:
+                    continue
+                if ((kind == 'tag' and name == value) or
+                        (kind == 'class' and classes and value in classes) or
+                        (kind == 'id' and element_id == value)):
+                    ranges[index] = [len(pieces), len(pieces)]
+                    matched.append(index)
+            if matched:
+                stack.append((node, matched))
+            
+            stack.extend(reversed(node.contents))
+        
+        # Como en extract_text_from_html: gana el primer selector con elemento,
+        # y si su texto está vacío se usa el body
+        body_index = len(selectors) - 1
+        main_content = ""
+        content_matches = [index for index in sorted(ranges) if index != body_index]
+        if content_matches:
+            start, end = ranges[content_matches[0]]
+            main_content = ' '.join(pieces[start:end])
+        if not main_content and body_index in ranges:
+            start, end = ranges[body_index]
+            main_content = ' '.join(pieces[start:end])
+        
+        # PDFs mencionados como texto en la página
+        for match in PDF_TEXT_PATTERN.findall(' '.join(pieces)):
+            if self.is_valid_unex_url(match):
+                pdf_links.add(match)
+        
+        page = {
+            'title': title or "",
+            'text': self.clean_text(main_content),
+            'internal_links': internal_links,
+            'pdf_links': list(pdf_links)
+        }
+        self.metrics.add_stage('extract', (time.perf_counter() - extract_start) * 1000)
+        return page
+
+    def extract_pdf_content(self, url: str) -> Optional[dict]:
+        """Extrae contenido de un archivo PDF usando PyMuPDF directamente desde memoria"""
+        self.logger.info(f"📄 Procesando PDF: {url}")
+        
+        # Verificar si ya procesamos este PDF
+        url_hash = self.pdf_url_hash(url)
+        if url_hash in self.visited_pdfs:
+            return None
+        self.visited_pdfs.add(url_hash)
+        
+        with self.metrics.track(url, 'pdf'):
             try:
-                # Extraer texto usando PyMuPDF
-                doc = fitz.open(temp_file_path)
-                text_content = ""
+                if not self.allowed_by_robots(url):
+                    return None
+                if self.lastmod_unchanged(url):
+                    return self.reuse_cached_record(url)
                 
-                for page_num in range(len(doc)):
-                    page = doc[page_num]
-                    text_content += page.get_text() + "\n"
+                response, unchanged, content_hash = self.conditional_get(url, timeout=30,
+                                                                         max_bytes=self.max_pdf_bytes)
+                if unchanged:
+                    return self.reuse_cached_record(url, response)
                 
-                doc.close()
+                # Verificar que el contenido es realmente un PDF
+                if not response.content.startswith(b'%PDF'):
+                    self.logger.warning(f"El archivo no parece ser un PDF válido: {url}")
+                    self.metrics.set_outcome('invalid')
+                    self.remember(url, response, content_hash, None)
+                    return None
                 
-                # Limpiar texto
-                cleaned_text = self.clean_text(text_content)
+                with self.metrics.stage('pdf_extract'):
+                    text_content, total_pages, extracted_pages = self.extract_pdf_text(response.content)
+                    # Limpiar texto
+                    cleaned_text = self.clean_text(text_content)
+                if extracted_pages < total_pages:
+                    self.logger.warning(f"✂️ PDF truncado a {extracted_pages}/{total_pages} páginas: {url}")
                 
+                record = None
                 if len(cleaned_text) > 50:  # Contenido mínimo
-                    self.pdf_count += 1
-                    word_count = len(cleaned_text.split())
-                    self.total_words += word_count
-                    
-                    return {
+                    record = {
                         'url': url,
                         'title': f"PDF - {Path(urlparse(url).path).name}",
                         'content': cleaned_text,
                         'content_type': 'pdf',
-                        'word_count': word_count,
-                        'pages': len(doc) if 'doc' in locals() else 0,
+                        'word_count': len(cleaned_text.split()),
+                        'pages': total_pages,
+                        'pages_extracted': extracted_pages,
                         'scraped_at': time.time()
                     }
-                    
-            finally:
-                # Limpiar archivo temporal
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                    
-        except Exception as e:
-            self.logger.error(f"❌ Error procesando PDF {url}: {str(e)}")
+                    self.count_record(record)
+                else:
+                    self.metrics.set_outcome('empty')
+                
+                self.remember(url, response, content_hash, record)
+                return record
+            
+            except ContentTooLarge as e:
+                self.logger.warning(f"⏭️ PDF omitido por tamaño {url}: {str(e)}")
+                self.metrics.set_outcome('too_large')
+            except Exception as e:
+                self.logger.error(f"❌ Error procesando PDF {url}: {str(e)}")
+                self.metrics.set_error(e)
         
         return None
 
+    def extract_pdf_text(self, pdf_bytes: bytes):
+        """Extrae el texto de un PDF en memoria respetando el presupuesto de páginas.
+        
+        Los documentos grandes se reparten por rangos de páginas en un pool de
+        procesos. Devuelve (texto, páginas totales, páginas extraídas).
+        """
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            total_pages = doc.page_count
+            extracted_pages = min(total_pages, self.max_pdf_pages)
+            
+            if extracted_pages <= self.pdf_pages_per_task:
+                return extract_pdf_pages(doc, 0, extracted_pages), total_pages, extracted_pages
+        
+        pool = self.get_pdf_pool()
+        futures = [
+            pool.submit(extract_pdf_pages, pdf_bytes, start, min(start + self.pdf_pages_per_task, extracted_pages))
+            for start in range(0, extracted_pages, self.pdf_pages_per_task)
+        ]
+        try:
+            deadline = time.monotonic() + self.pdf_timeout
+            parts = [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+        except FuturesTimeout:
+            for future in futures:
+                future.cancel()
+            raise TimeoutError(f"extracción de texto superó {self.pdf_timeout}s")
+        
+        return "\n".join(parts), total_pages, extracted_pages
+
+    def get_pdf_pool(self) -> ProcessPoolExecutor:
+        """Crea bajo demanda el pool de procesos para PDFs grandes"""
+        with self.stats_lock:
+            if self.pdf_pool is None:
+                self.pdf_pool = ProcessPoolExecutor(max_workers=self.pdf_workers)
+            return self.pdf_pool
+
     def extract_html_content(self, url: str) -> Optional[dict]:
         """Extrae contenido de una página HTML"""
-        try:
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extraer título
-            title_elem = soup.find('title')
-            title = title_elem.get_text().strip() if title_elem else ""
-            
-            # Extraer contenido de texto limpio
-            text_content = self.extract_text_from_html(soup)
-            
-            # Buscar todos los PDFs en la página
-            pdf_links = self.find_all_pdf_links(soup, url)
-            
-            # Encontrar enlaces internos para continuar el crawling
-            internal_links = []
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                if href:
-                    full_url = urljoin(url, href)
-                    if (self.is_valid_unex_url(full_url) and 
-                        not self.is_pdf_url(full_url) and 
-                        full_url not in self.visited_urls):
-                        internal_links.append(full_url)
-            
-            # Solo guardar si tiene contenido significativo
-            if len(text_content) < 100:
-                return {
+        with self.metrics.track(url, 'html'):
+            try:
+                if not self.allowed_by_robots(url):
+                    return None
+                if self.lastmod_unchanged(url):
+                    return self.reuse_cached_record(url)
+                
+                response, unchanged, content_hash = self.conditional_get(url, timeout=15)
+                if unchanged:
+                    return self.reuse_cached_record(url, response)
+                
+                page = self.parse_html(response.content, url)
+                title = page['title']
+                text_content = page['text']
+                internal_links = page['internal_links']
+                pdf_links = page['pdf_links']
+                
+                # Solo guardar el texto si tiene contenido significativo
+                if len(text_content) < 100:
+                    text_content = ""
+                    self.metrics.set_outcome('empty')
+                
+                record = {
                     'url': url,
                     'title': title,
-                    'content': "",
+                    'content': text_content,
                     'content_type': 'html',
-                    'internal_links': internal_links[:15],  # Limitar enlaces
+                    'internal_links': internal_links[:15],  # Limitar para no saturar
                     'pdf_links': pdf_links,
-                    'word_count': 0,
+                    'word_count': len(text_content.split()),
                     'scraped_at': time.time()
                 }
-            
-            self.html_count += 1
-            word_count = len(text_content.split())
-            self.total_words += word_count
-            
-            return {
-                'url': url,
-                'title': title,
-                'content': text_content,
-                'content_type': 'html',
-                'internal_links': internal_links[:15],  # Limitar para no saturar
-                'pdf_links': pdf_links,
-                'word_count': word_count,
-                'scraped_at': time.time()
-            }
-            
-        except Exception as e:
-            self.logger.error(f"❌ Error procesando HTML {url}: {str(e)}")
-            return None
+                self.count_record(record)
+                self.remember(url, response, content_hash, record)
+                return record
+                
+            except Exception as e:
+                self.logger.error(f"❌ Error procesando HTML {url}: {str(e)}")
+                self.metrics.set_error(e)
+                return None
+
+    def conditional_get(self, url: str, timeout: int, max_bytes: Optional[int] = None):
+        """GET condicional contra la caché de descargas.
+        
+        Devuelve (response, unchanged, content_hash); si `unchanged` es True el
+        servidor respondió 304 o el contenido es idéntico al cacheado. Con
+        `max_bytes` se lanza ContentTooLarge antes de descargar el cuerpo si
+        Content-Length lo supera, o durante la descarga en cuanto lo recibido
+        pasa del límite.
+        """
+        key = canonicalize_url(url)
+        entry = self.fetch_cache.get(key) if self.fetch_cache else None
+        headers = self.fetch_cache.conditional_headers(key) if entry else {}
+        
+        # stream=True separa el tiempo hasta las cabeceras (DNS, conexión, TLS y
+        # espera del servidor) del tiempo de descarga del cuerpo
+        with self.metrics.stage('ttfb'):
+            response = self.session.get(url, timeout=timeout, headers=headers, stream=True)
+        
+        if entry and response.status_code == 304:
+            response.close()
+            self.metrics.set_response(response.status_code, 0)
+            return response, True, entry['content_hash']
+        if response.status_code >= 400:
+            response.close()
+            self.metrics.set_response(response.status_code, 0)
+            response.raise_for_status()
+        
+        if max_bytes is not None:
+            declared = int(response.headers.get('Content-Length') or 0)
+            if declared > max_bytes:
+                response.close()
+                self.metrics.set_response(response.status_code, 0)
+                raise ContentTooLarge(f"{declared:,} bytes > {max_bytes:,}")
+        
+        with self.metrics.stage('download'):
+            if max_bytes is None:
+                content = response.content
+            else:
+                # Sin Content-Length (o si miente) se corta al pasar del límite
+                # en vez de descargar y guardar en memoria el cuerpo entero
+                chunks, received = [], 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    received += len(chunk)
+                    if received > max_bytes:
+                        response.close()
+                        self.metrics.set_response(response.status_code, received)
+                        raise ContentTooLarge(f"más de {max_bytes:,} bytes sin terminar la descarga")
+                    chunks.append(chunk)
+                content = b''.join(chunks)
+                # Los llamadores leen el cuerpo de response.content
+                response._content = content
+                response._content_consumed = True
+        self.metrics.set_response(response.status_code, len(content))
+        
+        content_hash = FetchCache.content_hash(content)
+        return response, bool(entry and entry['content_hash'] == content_hash), content_hash
+
+    def allowed_by_robots(self, url: str) -> bool:
+        """Comprueba robots.txt antes de descargar"""
+        if not self.respect_robots or self.discovery.can_fetch(url):
+            return True
+        self.logger.info(f"🚫 Bloqueado por robots.txt: {url}")
+        self.metrics.set_outcome('robots_blocked')
+        with self.stats_lock:
+            self.robots_blocked += 1
+        return False
+
+    def lastmod_unchanged(self, url: str) -> bool:
+        """Indica si el sitemap declara el mismo lastmod que en la última descarga"""
+        if not self.fetch_cache:
+            return False
+        key = canonicalize_url(url)
+        return self.fetch_cache.is_fresh(key, self.sitemap_lastmod.get(key))
+
+    def seed_from_sitemaps(self):
+        """Añade a la frontera las URLs de los sitemaps de los hosts prioritarios"""
+        added = 0
+        for url, lastmod in self.discovery.discover(self.priority_urls):
+            if not self.is_valid_unex_url(url):
+                continue
+            if lastmod:
+                self.sitemap_lastmod[canonicalize_url(url)] = lastmod
+            if self.is_pdf_url(url):
+                added += self.frontier.add_pdf(url)
+            else:
+                added += self.frontier.add_page(url, seed=True)
+        self.logger.info(f"🗺️ {added} URLs nuevas añadidas desde sitemaps")
+
+    def host_delay(self, url: str) -> float:
+        """Pausa entre peticiones a un host: la configurada o el Crawl-delay de robots.txt"""
+        if not self.respect_robots:
+            return self.per_host_delay
+        return max(self.per_host_delay, self.discovery.crawl_delay(url))
+
+    def reuse_cached_record(self, url: str, response=None) -> Optional[dict]:
+        """Reutiliza el registro extraído en una ejecución anterior.
+        
+        Sin `response` no se ha hecho petición (lastmod del sitemap sin cambios).
+        """
+        key = canonicalize_url(url)
+        if response is None:
+            record = self.fetch_cache.reuse(key)
+            self.metrics.set_outcome('lastmod_skip')
+        else:
+            record = self.fetch_cache.revalidate(key, response, self.sitemap_lastmod.get(key))
+            self.metrics.set_outcome('not_modified' if response.status_code == 304 else 'unchanged')
+        self.logger.info(f"♻️ Sin cambios, reutilizando contenido cacheado: {url}")
+        if record:
+            record['scraped_at'] = time.time()
+            self.count_record(record)
+        return record
+
+    def remember(self, url: str, response, content_hash: str, record: Optional[dict]):
+        """Guarda en la caché el resultado de una extracción"""
+        if self.fetch_cache:
+            key = canonicalize_url(url)
+            self.fetch_cache.store(key, response, content_hash, record, self.sitemap_lastmod.get(key))
+
+    def count_record(self, record: dict):
+        """Actualiza las estadísticas con un registro con contenido"""
+        if not record.get('content'):
+            return
+        with self.stats_lock:
+            if record['content_type'] == 'pdf':
+                self.pdf_count += 1
+            else:
+                self.html_count += 1
+            self.total_words += record['word_count']
 
     def process_single_url(self, url: str) -> Optional[dict]:
         """Procesa una URL única (HTML o PDF)"""
-        if url in self.visited_urls:
+        key = canonicalize_url(url)
+        if key in self.visited_urls:
             return None
             
-        self.visited_urls.add(url)
-        
+        self.visited_urls.add(key)
+        return self.fetch_url(url)
+
+    def pdf_url_hash(self, url: str) -> str:
+        """Clave de un PDF en visited_pdfs"""
+        return hashlib.md5(canonicalize_url(url).encode()).hexdigest()
+
+    def fetch_url(self, url: str) -> Optional[dict]:
+        """Descarga y extrae una URL (HTML o PDF) sin comprobar si ya fue visitada"""
         if self.is_pdf_url(url):
             return self.extract_pdf_content(url)
         else:
             return self.extract_html_content(url)
 
-    def scrape_website(self) -> List[dict]:
+    def start_crawl(self, resume: bool = False):
+        """Prepara la frontera y el corpus; con `resume` continúa un crawl interrumpido"""
+        self.frontier = CrawlFrontier(self.priority_urls)
+        self.metrics.reset()
+        if self.corpus_path:
+            self.open_corpus(resume)
+        if self.use_sitemaps:
+            self.seed_from_sitemaps()
+
+    def open_corpus(self, resume: bool):
+        """Abre el corpus JSONL y, con `resume`, restaura el estado del crawl anterior"""
+        if resume and os.path.exists(self.corpus_path):
+            # El corpus es la referencia de lo ya extraído, aunque el checkpoint sea anterior
+            for record in iter_corpus(self.corpus_path):
+                if record.get('content_type') == 'pdf':
+                    self.visited_pdfs.add(self.pdf_url_hash(record['url']))
+                else:
+                    self.visited_urls.add(canonicalize_url(record['url']))
+                self.count_record(record)
+                self.records_count += 1
+            
+            state = load_checkpoint(self.checkpoint_path)
+            if state:
+                self.frontier = CrawlFrontier(max_pending=self.frontier.max_pending)
+                self.frontier.pages.extend(state['pages'])
+                self.frontier.pdfs.extend(state['pdfs'])
+                self.frontier.seen.update(state['seen'])
+                self.visited_urls.update(state['visited_urls'])
+                self.visited_pdfs.update(state['visited_pdfs'])
+                self.pdfs_started = state['pdfs_started']
+            
+            self.logger.info(f"⏯️ Reanudando crawl: {self.records_count} registros ya en {self.corpus_path}, "
+                             f"{len(self.frontier.pages)} páginas pendientes")
+        
+        self.corpus_writer = CorpusWriter(self.corpus_path, append=resume)
+        self.last_checkpoint = time.monotonic()
+
+    def add_content(self, content: dict):
+        """Registra un resultado: en el corpus JSONL si está activo, si no en memoria"""
+        if self.corpus_writer:
+            self.corpus_writer.write(content)
+        else:
+            self.content_data.append(content)
+        self.records_count += 1
+
+    def maybe_checkpoint(self, in_flight: Optional[List[str]] = None):
+        """Guarda un checkpoint si ha pasado checkpoint_interval desde el último"""
+        if self.corpus_writer and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint(in_flight)
+
+    def save_checkpoint(self, in_flight: Optional[List[str]] = None):
+        """Guarda frontera y URLs visitadas; las descargas en vuelo vuelven a la cola"""
+        in_flight = in_flight or []
+        pending_pages = [url for url in in_flight if not self.is_pdf_url(url)]
+        pending_pdfs = [url for url in in_flight if self.is_pdf_url(url)]
+        pending_keys = {canonicalize_url(url) for url in pending_pages}
+        pending_hashes = {self.pdf_url_hash(url) for url in pending_pdfs}
+        
+        save_checkpoint(self.checkpoint_path, {
+            'pages': pending_pages + list(self.frontier.pages),
+            'pdfs': pending_pdfs + list(self.frontier.pdfs),
+            'seen': list(self.frontier.seen),
+            'visited_urls': list(self.visited_urls - pending_keys),
+            'visited_pdfs': list(self.visited_pdfs - pending_hashes),
+            'pdfs_started': self.pdfs_started - len(pending_pdfs),
+            'saved_at': time.time()
+        })
+        self.last_checkpoint = time.monotonic()
+
+    def scrape_website(self, concurrent: bool = False, resume: bool = False) -> List[dict]:
         """Ejecuta el scraping completo del sitio web con procesamiento paralelo de PDFs"""
-        urls_to_visit = self.priority_urls.copy()
-        pdf_queue = []
+        if concurrent:
+            return asyncio.run(self.scrape_website_async(resume=resume))
+        
+        self.start_crawl(resume)
         
         self.logger.info(f"🚀 Iniciando scraping de {self.max_pages} páginas máximo")
         
-        while urls_to_visit and len(self.visited_urls) < self.max_pages:
-            current_url = urls_to_visit.pop(0)
-            
-            if current_url in self.visited_urls:
-                continue
-            
-            progress = len(self.visited_urls) + 1
-            self.logger.info(f"🔍 ({progress}/{self.max_pages}) Procesando: {current_url}")
-            
-            content = self.process_single_url(current_url)
-            
-            if content:
-                self.content_data.append(content)
+        current_url = None
+        # PDFs enviados al pool y aún sin resultado -> su URL
+        pdf_futures: Dict = {}
+        try:
+            while self.frontier.pages and len(self.visited_urls) < self.max_pages:
+                current_url = self.frontier.pop_page()
+                if canonicalize_url(current_url) in self.visited_urls:
+                    continue
+                
+                progress = len(self.visited_urls) + 1
+                self.logger.info(f"🔍 ({progress}/{self.max_pages}) Procesando: {current_url}")
                 
-                # Agregar PDFs encontrados a la cola
-                if 'pdf_links' in content and content['pdf_links']:
-                    for pdf_url in content['pdf_links']:
-                        if pdf_url not in [item['url'] for item in self.content_data]:
-                            pdf_queue.append(pdf_url)
+                content = self.process_single_url(current_url)
+                
+                if content:
+                    self.add_content(content)
+                    
+                    # Agregar PDFs encontrados a la cola
+                    if 'pdf_links' in content and content['pdf_links']:
+                        for pdf_url in content['pdf_links']:
+                            self.frontier.add_pdf(pdf_url)
+                        
+                        self.logger.info(f"📎 Encontrados {len(content['pdf_links'])} PDFs en la página")
                     
-                    self.logger.info(f"📎 Encontrados {len(content['pdf_links'])} PDFs en la página")
+                    # Agregar enlaces internos a la cola
+                    if 'internal_links' in content:
+                        for link in content['internal_links']:
+                            self.frontier.add_page(link)
                 
-                # Agregar enlaces internos a la cola
-                if 'internal_links' in content:
-                    for link in content['internal_links']:
-                        if link not in self.visited_urls and len(urls_to_visit) < 100:
-                            urls_to_visit.append(link)
+                # Pausa entre peticiones (o el Crawl-delay de robots.txt) del host recién visitado
+                delay = self.host_delay(current_url)
+                current_url = None
+                self.maybe_checkpoint()
+                time.sleep(delay)
             
-            # Pausa breve
-            time.sleep(0.3)
+            # Procesar PDFs encontrados (los ya empezados en una ejecución anterior cuentan)
+            if self.frontier.pdfs and self.pdfs_started < self.max_pdfs:
+                self.logger.info(f"📚 Procesando {min(len(self.frontier.pdfs), self.max_pdfs - self.pdfs_started)} "
+                                 f"PDFs encontrados...")
+                
+                # Procesar PDFs con paralelización limitada; sin `with` para no esperar a
+                # toda la cola si se interrumpe
+                executor = ThreadPoolExecutor(max_workers=3)
+                try:
+                    while self.frontier.pdfs and self.pdfs_started < self.max_pdfs:
+                        pdf_url = self.frontier.pop_pdf()
+                        self.pdfs_started += 1
+                        pdf_futures[executor.submit(self.extract_pdf_content, pdf_url)] = pdf_url
+                    
+                    for future in as_completed(list(pdf_futures)):
+                        pdf_content = future.result()
+                        del pdf_futures[future]
+                        if pdf_content:
+                            self.add_content(pdf_content)
+                        self.maybe_checkpoint(list(pdf_futures.values()))
+                finally:
+                    executor.shutdown(wait=not pdf_futures, cancel_futures=True)
+        except KeyboardInterrupt:
+            # Guardar el estado para poder reanudar con resume=True; las descargas
+            # en curso o en cola vuelven a la frontera
+            if self.corpus_writer:
+                in_flight = ([current_url] if current_url else []) + list(pdf_futures.values())
+                self.save_checkpoint(in_flight or None)
+                self.corpus_writer.close()
+            raise
         
-        # Procesar PDFs encontrados
-        if pdf_queue:
-            self.logger.info(f"📚 Procesando {len(pdf_queue)} PDFs encontrados...")
-            
-            # Procesar PDFs con paralelización limitada
-            with ThreadPoolExecutor(max_workers=3) as executor:
-                pdf_futures = {executor.submit(self.extract_pdf_content, pdf_url): pdf_url 
-                              for pdf_url in pdf_queue[:50]}  # Limitar PDFs
+        self.finish_crawl()
+        return self.content_data
+
+    async def scrape_website_async(self, resume: bool = False) -> List[dict]:
+        """Scraping concurrente: HTML y PDFs comparten un pool acotado de descargas en vuelo"""
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        host_limiters: Dict[str, HostRateLimiter] = {}
+        
+        self.start_crawl(resume)
+        in_flight: Dict[asyncio.Task, str] = {}
+        
+        async def fetch(url: str, is_pdf: bool) -> Optional[dict]:
+            host = urlparse(url).netloc
+            limiter = host_limiters.get(host)
+            if limiter is None:
+                # robots.txt puede requerir descarga: fuera del bucle de eventos
+                delay = await loop.run_in_executor(executor, self.host_delay, url)
+                limiter = host_limiters.setdefault(host, HostRateLimiter(self.per_host_concurrency, delay))
+            async with limiter:
+                func = self.extract_pdf_content if is_pdf else self.fetch_url
+                return await loop.run_in_executor(executor, func, url)
+        
+        self.logger.info(f"🚀 Iniciando scraping concurrente de {self.max_pages} páginas máximo "
+                         f"({self.max_concurrency} descargas simultáneas)")
+        
+        try:
+            while True:
+                # Rellenar el pool de descargas; los PDFs se intercalan con el HTML
+                while len(in_flight) < self.max_concurrency:
+                    if self.frontier.pdfs and self.pdfs_started < self.max_pdfs:
+                        pdf_url = self.frontier.pop_pdf()
+                        self.pdfs_started += 1
+                        task = asyncio.ensure_future(fetch(pdf_url, True))
+                        in_flight[task] = pdf_url
+                        continue
+                    
+                    if not self.frontier.pages or len(self.visited_urls) >= self.max_pages:
+                        break
+                    
+                    current_url = self.frontier.pop_page()
+                    key = canonicalize_url(current_url)
+                    if key in self.visited_urls:
+                        continue
+                    self.visited_urls.add(key)
+                    progress = len(self.visited_urls)
+                    self.logger.info(f"🔍 ({progress}/{self.max_pages}) Procesando: {current_url}")
+                    task = asyncio.ensure_future(fetch(current_url, False))
+                    in_flight[task] = current_url
+                
+                if not in_flight:
+                    break
+                
+                done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url = in_flight.pop(task)
+                    try:
+                        content = task.result()
+                    except Exception as e:
+                        self.logger.error(f"❌ Error procesando {url}: {str(e)}")
+                        self.metrics.set_error(e)
+                        continue
+                    
+                    if not content:
+                        continue
+                    self.add_content(content)
+                    
+                    # Agregar PDFs encontrados a la cola
+                    if content.get('pdf_links'):
+                        for pdf_url in content['pdf_links']:
+                            self.frontier.add_pdf(pdf_url)
+                        
+                        self.logger.info(f"📎 Encontrados {len(content['pdf_links'])} PDFs en la página")
+                    
+                    # Agregar enlaces internos a la cola
+                    for link in content.get('internal_links', []):
+                        self.frontier.add_page(link)
                 
-                for future in as_completed(pdf_futures):
-                    pdf_content = future.result()
-                    if pdf_content:
-                        self.content_data.append(pdf_content)
+                self.maybe_checkpoint(list(in_flight.values()))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            # Guardar el estado para poder reanudar con resume=True
+            if self.corpus_writer:
+                self.save_checkpoint(list(in_flight.values()))
+                self.corpus_writer.close()
+            raise
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        # Mostrar estadísticas finales
-        self.print_statistics()
+        self.finish_crawl()
         return self.content_data
 
+    def finish_crawl(self):
+        """Cierra el corpus, persiste la caché de descargas, libera el pool de PDFs y muestra las estadísticas finales"""
+        if self.corpus_writer:
+            self.corpus_writer.close()
+            # Crawl completo: el checkpoint ya no es necesario
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+        if self.fetch_cache:
+            self.fetch_cache.save()
+        if self.pdf_pool is not None:
+            self.pdf_pool.shutdown(cancel_futures=True)
+            self.pdf_pool = None
+        self.metrics.finish()
+        self.print_statistics()
+
     def print_statistics(self):
         """Muestra estadísticas detalladas del scraping"""
-        total_pages = len(self.content_data)
+        total_pages = self.records_count
         avg_words = self.total_words // total_pages if total_pages > 0 else 0
         
         print("\n" + "="*60)
@@ -401,28 +1057,60 @@ class EnhancedWebScraper:
         print(f"📝 Total palabras extraídas: {self.total_words:,}")
         print(f"📊 Promedio palabras por página: {avg_words:,}")
         print(f"💾 URLs visitadas: {len(self.visited_urls)}")
+        if self.robots_blocked:
+            print(f"🚫 Bloqueadas por robots.txt: {self.robots_blocked}")
+        if self.fetch_cache:
+            print(f"♻️ Sin cambios (304): {self.fetch_cache.not_modified} | "
+                  f"Contenido idéntico: {self.fetch_cache.unchanged} | "
+                  f"Lastmod sin cambios: {self.fetch_cache.lastmod_skipped} | "
+                  f"Bytes ahorrados: {self.fetch_cache.bytes_saved:,}")
+        
+        summary = self.metrics.summary()
+        print(f"⏱️ Tiempo total: {summary['elapsed_s']:.1f}s | "
+              f"{summary['urls_per_sec']:.2f} URLs/s | {summary['bytes'] / 1024 / 1024:.1f} MB descargados")
+        for content_type, latency in summary['latency_by_content_type'].items():
+            print(f"   {content_type}: p50 {latency['p50_ms']:.0f} ms | p90 {latency['p90_ms']:.0f} ms | "
+                  f"p99 {latency['p99_ms']:.0f} ms ({latency['count']} URLs)")
+        if summary['errors_by_class']:
+            errors = ', '.join(f"{name}: {count}" for name, count in
+                               sorted(summary['errors_by_class'].items(), key=lambda item: -item[1]))
+            print(f"❌ Errores: {errors}")
         print("="*60)
 
-    def save_data(self, filename: str = "unex_content_enhanced.json"):
-        """Guarda los datos extraídos en un archivo JSON"""
-        # Preparar metadatos
-        metadata = {
-            'scraping_stats': {
-                'total_pages': len(self.content_data),
-                'html_pages': self.html_count,
-                'pdf_documents': self.pdf_count,
-                'total_words': self.total_words,
-                'scraped_at': time.time(),
-                'urls_visited': len(self.visited_urls)
-            },
-            'content': self.content_data
+    def scraping_stats(self) -> dict:
+        """Resumen del crawl que acompaña al corpus"""
+        return {
+            'total_pages': self.records_count,
+            'html_pages': self.html_count,
+            'pdf_documents': self.pdf_count,
+            'total_words': self.total_words,
+            'scraped_at': time.time(),
+            'urls_visited': len(self.visited_urls)
         }
+
+    def save_data(self, filename: str = "unex_content_enhanced.json"):
+        """Guarda los datos extraídos en un archivo JSON.
+        
+        Si el crawl escribió el corpus en streaming (corpus_path), el contenido ya
+        está en disco y solo se guardan las estadísticas junto al corpus.
+        """
+        if self.corpus_path:
+            filename = f"{os.path.splitext(self.corpus_path)[0]}.stats.json"
+            metadata = {'scraping_stats': self.scraping_stats(), 'corpus': self.corpus_path}
+        else:
+            metadata = {'scraping_stats': self.scraping_stats(), 'content': self.content_data}
         
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, ensure_ascii=False, indent=2)
         
+        # Informe de instrumentación junto al corpus, para comparar ejecuciones
+        base = os.path.splitext(self.corpus_path or filename)[0]
+        metrics_file = f"{base}.metrics.json"
+        self.metrics.export(metrics_file, {'scraping_stats': metadata['scraping_stats']})
+        
         self.logger.info(f"💾 Datos guardados en {filename}")
         print(f"✅ Archivo guardado: {filename}")
+        print(f"📈 Métricas del crawl: {metrics_file}")
 
 if __name__ == "__main__":
     # Instalar dependencias necesarias si no están instaladas
@@ -433,11 +1121,14 @@ if __name__ == "__main__":
         os.system("pip install PyMuPDF")
         import fitz
     
-    scraper = EnhancedWebScraper(max_pages=200)
-    content = scraper.scrape_website()
+    # Con --resume se continúa un crawl interrumpido desde su checkpoint
+    resume = '--resume' in sys.argv
+    
+    scraper = EnhancedWebScraper(max_pages=200, corpus_path="unex_content.jsonl")
+    scraper.scrape_website(concurrent=True, resume=resume)
     scraper.save_data()
     
     print(f"\n🎉 Scraping completado exitosamente!")
-    print(f"📄 {len(content)} páginas procesadas en total")
+    print(f"📄 {scraper.records_count} páginas procesadas en total")
     print(f"📋 {scraper.pdf_count} documentos PDF extraídos")
     print(f"🌐 {scraper.html_count} páginas HTML procesadas")
\ No newline at end of file